@@ -4,6 +4,7 @@ import json
 import logging
 from urllib.parse import urlencode
 import concurrent.futures
+from collections import deque
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from dataclasses import dataclass, field, fields, asdict
@@ -22,17 +23,77 @@ with open("config.json", "r") as config_file:
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def scrape_search_results(keyword, location, page_number, retries=3):
+def search_url(keyword, page_number):
     formatted_keyword = keyword.replace(" ", "+")
-    url = f"https://www.g2.com/search?page={page_number+1}&query={formatted_keyword}"
+    return f"https://www.g2.com/search?page={page_number+1}&query={formatted_keyword}"
+
+
+def fetch_page(url):
+    driver = webdriver.Chrome(options=OPTIONS)
+    try:
+        driver.get(url)
+    except Exception:
+        driver.quit()
+        raise
+    logger.info(f"Fetched {url}")
+    return driver
+
+
+class PagePrefetcher:
+
+    def __init__(self, urls, lookahead=1):
+        self.urls = iter(urls)
+        self.lookahead = lookahead
+        # At most lookahead pages are loading while the current one is parsed
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=lookahead)
+        self.pending = deque()
+        self.stopped = False
+
+    def fill(self):
+        while not self.stopped and len(self.pending) < self.lookahead:
+            url = next(self.urls, None)
+            if url is None:
+                return
+            self.pending.append((url, self.executor.submit(fetch_page, url)))
+
+    def __iter__(self):
+        self.fill()
+        while self.pending:
+            url, future = self.pending.popleft()
+            try:
+                driver = future.result()
+            except Exception as e:
+                logger.warning(f"Prefetch failed for {url}: {e}")
+                driver = None
+            # Start the next page loading before handing this one over for parsing
+            self.fill()
+            yield url, driver
+
+    def stop(self):
+        self.stopped = True
+        while self.pending:
+            url, future = self.pending.popleft()
+            if not future.cancel():
+                # Already loading, close the browser whenever it gets there
+                future.add_done_callback(lambda done: done.exception() is None and done.result().quit())
+            logger.info(f"Cancelled prefetch of {url}")
+        self.executor.shutdown(wait=False)
+
+
+def scrape_search_results(keyword, location, page_number, retries=3, prefetched_driver=None):
+    url = search_url(keyword, page_number)
     tries = 0
     success = False
+    cards_found = 0
     
     while tries <= retries and not success:
-        driver = webdriver.Chrome(options=OPTIONS)
+        driver = prefetched_driver or webdriver.Chrome(options=OPTIONS)
         try:
-            driver.get(url)
-            logger.info(f"Fetched {url}")
+            if prefetched_driver is None:
+                driver.get(url)
+                logger.info(f"Fetched {url}")
+            # A retry always starts from a fresh browser
+            prefetched_driver = None
                 
             ## Extract Data
 
@@ -63,6 +124,7 @@ def scrape_search_results(keyword, location, page_number, retries=3):
                 }
                 print(search_data)
 
+            cards_found = len(div_cards)
             logger.info(f"Successfully parsed data from: {url}")
             success = True
         
@@ -70,17 +132,27 @@ def scrape_search_results(keyword, location, page_number, retries=3):
         except Exception as e:
             logger.error(f"An error occurred while processing page {url}: {e}")
             logger.info(f"Retrying request for page: {url}, retries left {retries-tries}")
+            tries += 1
 
         finally:
             driver.quit()
 
     if not success:
         raise Exception(f"Max Retries exceeded: {retries}")
+    return cards_found
 
 
-def start_scrape(keyword, pages, location, max_threads=5, retries=3):
-    for page in range(pages):
-        scrape_search_results(keyword, location, page_number, retries=retries)
+def start_scrape(keyword, pages, location, max_threads=5, retries=3, lookahead=1):
+    urls = [search_url(keyword, page) for page in range(pages)]
+    prefetcher = PagePrefetcher(urls, lookahead=lookahead)
+    try:
+        for page_number, (url, driver) in enumerate(prefetcher):
+            cards_found = scrape_search_results(keyword, location, page_number, retries=retries, prefetched_driver=driver)
+            if cards_found == 0:
+                logger.info(f"No results on page {page_number+1}, stopping")
+                break
+    finally:
+        prefetcher.stop()
 
 
 if __name__ == "__main__":
@@ -88,6 +160,7 @@ if __name__ == "__main__":
     MAX_RETRIES = 3
     MAX_THREADS = 5
     PAGES = 1
+    PREFETCH_DEPTH = 1
     LOCATION = "us"
 
     logger.info(f"Crawl starting...")
@@ -100,5 +173,5 @@ if __name__ == "__main__":
     for keyword in keyword_list:
         filename = keyword.replace(" ", "-")
 
-        start_scrape(keyword, PAGES, LOCATION, retries=MAX_RETRIES)
+        start_scrape(keyword, PAGES, LOCATION, retries=MAX_RETRIES, lookahead=PREFETCH_DEPTH)
     logger.info(f"Crawl complete.")
\ No newline at end of file
@@ -0,0 +1,410 @@
+import os
+import csv
+import time
+import sqlite3
+import tempfile
+import tracemalloc
+import logging
+import argparse
+from collections import defaultdict
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+## Logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+RECENT_DAYS = 90  # window for review velocity
+LOAD_CHUNK = 100_000  # rows fetched from SQLite at a time
+SUM_COLUMNS = ["count", "rating", "incentivized", "incentivized_rating", "recent", "dated", "x", "y", "xx", "xy"]
+
+
+class ReviewColumns:
+
+    def __init__(self, product, rating, day, validated, incentivized, product_names, keywords, pair_keyword, pair_product):
+        # One array per field and one index per review, instead of one object per review
+        self.product = product
+        self.rating = rating
+        self.day = day  # days since 1970-01-01, -1 when the review had no date
+        self.validated = validated
+        self.incentivized = incentivized
+        self.product_names = product_names
+        self.keywords = keywords
+        # product <-> keyword links, a product can be listed under several keywords
+        self.pair_keyword = pair_keyword
+        self.pair_product = pair_product
+
+    def __len__(self):
+        return len(self.rating)
+
+
+def load_columns(db_filename, chunk=LOAD_CHUNK):
+    connection = sqlite3.connect(f"file:{db_filename}?mode=ro", uri=True)
+    # Upper bound for the join below, so every column is allocated once and filled in place
+    capacity = connection.execute("SELECT COUNT(*) FROM reviews").fetchone()[0]
+    product_rowids = np.empty(capacity, dtype=np.int64)
+    rating = np.empty(capacity, dtype=np.float32)
+    day = np.empty(capacity, dtype=np.int32)
+    validated = np.empty(capacity, dtype=bool)
+    incentivized = np.empty(capacity, dtype=bool)
+
+    # SQLite turns dates into day numbers; "No date" or anything else unparseable comes back as -1
+    cursor = connection.execute("""
+        SELECT p.rowid, COALESCE(CAST(r.rating AS REAL), 0),
+               COALESCE(CAST(julianday(substr(r.date, 1, 10)) - 2440587.5 AS INTEGER), -1),
+               COALESCE(CAST(r.validated AS INTEGER), 0), COALESCE(CAST(r.incentivized AS INTEGER), 0)
+        FROM reviews r
+        JOIN products p ON p.g2_url = r.g2_url
+    """)
+    filled = 0
+    while True:
+        rows = cursor.fetchmany(chunk)
+        if not rows:
+            break
+        # One C-level conversion per chunk; every column is numeric so float64 holds them all exactly
+        block = np.array(rows, dtype=np.float64)
+        end = filled + len(rows)
+        product_rowids[filled:end] = block[:, 0]
+        rating[filled:end] = block[:, 1]
+        day[filled:end] = block[:, 2]
+        validated[filled:end] = block[:, 3] != 0
+        incentivized[filled:end] = block[:, 4] != 0
+        filled = end
+
+    # Dense 0..n-1 product index so every group-by is a bincount
+    rowids, product = np.unique(product_rowids[:filled], return_inverse=True)
+    names = dict(connection.execute("SELECT rowid, name FROM products"))
+
+    position = {int(rowid): index for index, rowid in enumerate(rowids)}
+    keyword_index = {}
+    pair_keyword = []
+    pair_product = []
+    for rowid, keyword in connection.execute(
+        "SELECT p.rowid, k.keyword FROM product_keywords k JOIN products p ON p.g2_url = k.g2_url"
+    ):
+        if rowid in position:
+            pair_keyword.append(keyword_index.setdefault(keyword, len(keyword_index)))
+            pair_product.append(position[rowid])
+    connection.close()
+
+    return ReviewColumns(
+        product=product.astype(np.int32),
+        rating=rating[:filled],
+        day=day[:filled],
+        validated=validated[:filled],
+        incentivized=incentivized[:filled],
+        product_names=[names[int(rowid)] for rowid in rowids],
+        keywords=list(keyword_index),
+        pair_keyword=np.array(pair_keyword, dtype=np.int32),
+        pair_product=np.array(pair_product, dtype=np.int32)
+    )
+
+
+def product_sums(columns):
+    n = len(columns.product_names)
+    group = columns.product
+    rating = columns.rating.astype(np.float64)
+    dated = columns.day >= 0
+    last_day = columns.day[dated].max() if dated.any() else 0
+    # Center time on the mean so the least-squares sums don't lose precision
+    x = np.where(dated, columns.day, 0).astype(np.float64)
+    x = np.where(dated, (x - x[dated].mean()) / 365.25, 0.0) if dated.any() else x
+
+    sums = {
+        "count": np.bincount(group, minlength=n).astype(np.float64),
+        "rating": np.bincount(group, weights=rating, minlength=n),
+        "incentivized": np.bincount(group, weights=columns.incentivized, minlength=n),
+        "incentivized_rating": np.bincount(group, weights=rating * columns.incentivized, minlength=n),
+        "recent": np.bincount(group, weights=dated & (columns.day > last_day - RECENT_DAYS), minlength=n),
+        "dated": np.bincount(group, weights=dated, minlength=n),
+        "x": np.bincount(group, weights=x, minlength=n),
+        "y": np.bincount(group, weights=rating * dated, minlength=n),
+        "xx": np.bincount(group, weights=x * x, minlength=n),
+        "xy": np.bincount(group, weights=x * rating * dated, minlength=n)
+    }
+    # Same dtype as day keeps ufunc.at on its fast path, a cast makes it ~20x slower
+    sums["first_day"] = np.full(n, np.iinfo(np.int32).max, dtype=np.int32)
+    sums["last_day"] = np.full(n, -1, dtype=np.int32)
+    np.minimum.at(sums["first_day"], group[dated], columns.day[dated])
+    np.maximum.at(sums["last_day"], group[dated], columns.day[dated])
+    return sums
+
+
+def keyword_sums(columns, sums):
+    # Every statistic is built from sums, so a keyword is just the sum over its products
+    n = len(columns.keywords)
+    totals = {
+        name: np.bincount(columns.pair_keyword, weights=sums[name][columns.pair_product], minlength=n)
+        for name in SUM_COLUMNS
+    }
+    totals["first_day"] = np.full(n, np.iinfo(np.int32).max, dtype=np.int32)
+    totals["last_day"] = np.full(n, -1, dtype=np.int32)
+    np.minimum.at(totals["first_day"], columns.pair_keyword, sums["first_day"][columns.pair_product])
+    np.maximum.at(totals["last_day"], columns.pair_keyword, sums["last_day"][columns.pair_product])
+    return totals
+
+
+def finalize(sums):
+    count = sums["count"]
+    organic = count - sums["incentivized"]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        average = sums["rating"] / count
+        incentivized_rating = sums["incentivized_rating"] / sums["incentivized"]
+        organic_rating = (sums["rating"] - sums["incentivized_rating"]) / organic
+        # Least-squares slope of rating against time, in stars per year
+        n = sums["dated"]
+        trend = (n * sums["xy"] - sums["x"] * sums["y"]) / (n * sums["xx"] - sums["x"] ** 2)
+        span = np.maximum(sums["last_day"].astype(np.int64) - sums["first_day"] + 1, 1)
+        lifetime_velocity = np.where(sums["last_day"] >= 0, n / span * 30, np.nan)
+    return {
+        "reviews": count.astype(np.int64),
+        "average_rating": average,
+        "rating_trend_per_year": np.where(n >= 2, trend, np.nan),
+        "incentivized_share": sums["incentivized"] / np.maximum(count, 1),
+        "incentivized_rating": incentivized_rating,
+        "organic_rating": organic_rating,
+        "incentive_gap": incentivized_rating - organic_rating,
+        "velocity_30d_recent": sums["recent"] / (RECENT_DAYS / 30),
+        "velocity_30d_lifetime": lifetime_velocity
+    }
+
+
+def monthly_trends(columns):
+    # (product, month) cells from one bincount, then summed into keywords
+    dated = columns.day >= 0
+    if not dated.any() or not len(columns.keywords):
+        return [], np.zeros((len(columns.keywords), 0)), np.zeros((len(columns.keywords), 0))
+    day = columns.day[dated]
+    first_day = day.min()
+    # Convert each distinct day once through a lookup table rather than every review through datetime64
+    month_of_day = np.arange(first_day, day.max() + 1).astype("datetime64[D]").astype("datetime64[M]").astype(np.int64)
+    month = month_of_day[day - first_day]
+    first_month = month_of_day[0]
+    months = int(month.max() - first_month + 1)
+    cell = columns.product[dated].astype(np.int64) * months + (month - first_month)
+    size = len(columns.product_names) * months
+    counts = np.bincount(cell, minlength=size).reshape(-1, months).astype(np.float64)
+    ratings = np.bincount(cell, weights=columns.rating[dated], minlength=size).reshape(-1, months)
+
+    keyword_counts = np.zeros((len(columns.keywords), months))
+    keyword_ratings = np.zeros((len(columns.keywords), months))
+    np.add.at(keyword_counts, columns.pair_keyword, counts[columns.pair_product])
+    np.add.at(keyword_ratings, columns.pair_keyword, ratings[columns.pair_product])
+    labels = [str(np.datetime64(int(first_month + offset), "M")) for offset in range(months)]
+    return labels, keyword_counts, keyword_ratings
+
+
+def analyze(columns):
+    sums = product_sums(columns)
+    products = finalize(sums)
+    keywords = finalize(keyword_sums(columns, sums))
+    return products, keywords, monthly_trends(columns)
+
+
+def write_statistics(filename, key_name, keys, statistics):
+    with open(filename, mode="w", newline="", encoding="utf-8") as file:
+        writer = csv.writer(file)
+        writer.writerow([key_name] + list(statistics))
+        columns = [statistics[name] for name in statistics]
+        for index, key in enumerate(keys):
+            writer.writerow([key] + [
+                int(value) if np.issubdtype(column.dtype, np.integer) else "" if np.isnan(value) else round(float(value), 4)
+                for value, column in ((column[index], column) for column in columns)
+            ])
+
+
+def write_trends(filename, keywords, trends):
+    labels, counts, ratings = trends
+    with open(filename, mode="w", newline="", encoding="utf-8") as file:
+        writer = csv.writer(file)
+        writer.writerow(["keyword", "month", "reviews", "average_rating"])
+        for keyword_index, keyword in enumerate(keywords):
+            for month_index in np.flatnonzero(counts[keyword_index]):
+                reviews = counts[keyword_index, month_index]
+                writer.writerow([
+                    keyword, labels[month_index], int(reviews),
+                    round(float(ratings[keyword_index, month_index] / reviews), 4)
+                ])
+
+
+def run_analytics(db_filename, output_prefix):
+    started = time.perf_counter()
+    columns = load_columns(db_filename)
+    loaded = time.perf_counter()
+    products, keywords, trends = analyze(columns)
+    analyzed = time.perf_counter()
+
+    write_statistics(f"{output_prefix}-products.csv", "product", columns.product_names, products)
+    write_statistics(f"{output_prefix}-keywords.csv", "keyword", columns.keywords, keywords)
+    write_trends(f"{output_prefix}-trends.csv", columns.keywords, trends)
+    logger.info(
+        f"{len(columns)} reviews, {len(columns.product_names)} products, {len(columns.keywords)} keywords: "
+        f"loaded in {loaded - started:.2f}s, analyzed in {analyzed - loaded:.2f}s"
+    )
+    for index, keyword in enumerate(columns.keywords):
+        logger.info(
+            f"{keyword}: {keywords['reviews'][index]} reviews, average {keywords['average_rating'][index]:.2f}, "
+            f"trend {keywords['rating_trend_per_year'][index]:+.3f}/year, "
+            f"incentive gap {keywords['incentive_gap'][index]:+.2f}, "
+            f"{keywords['velocity_30d_recent'][index]:.1f} reviews/30d recently"
+        )
+
+
+## Benchmark
+def synthetic_columns(reviews, products=20_000, keywords=50, seed=7):
+    rng = np.random.default_rng(seed)
+    # Zipf-ish popularity so a few products hold most reviews, like G2
+    popularity = 1 / np.arange(1, products + 1) ** 0.8
+    product = rng.choice(products, size=reviews, p=popularity / popularity.sum()).astype(np.int32)
+    quality = rng.normal(4.2, 0.4, size=products)
+    incentivized = rng.random(reviews) < 0.4
+    rating = quality[product] + rng.normal(0, 0.7, size=reviews) + incentivized * 0.3
+    rating = np.clip(np.round(rating * 2) / 2, 1, 5).astype(np.float32)
+    start = np.datetime64("2015-01-01", "D").astype(np.int64)
+    day = (start + (rng.random(reviews) ** 0.6) * 3650).astype(np.int32)
+    day[rng.random(reviews) < 0.01] = -1
+
+    pair_product = np.concatenate([np.arange(products), rng.choice(products, size=products // 2)])
+    pair_keyword = rng.integers(0, keywords, size=len(pair_product))
+    links = np.unique(np.stack([pair_keyword, pair_product]), axis=1)
+    return ReviewColumns(
+        product=product,
+        rating=rating,
+        day=day,
+        validated=rng.random(reviews) < 0.8,
+        incentivized=incentivized,
+        product_names=[f"product-{index}" for index in range(products)],
+        keywords=[f"keyword-{index}" for index in range(keywords)],
+        pair_keyword=links[0].astype(np.int32),
+        pair_product=links[1].astype(np.int32)
+    )
+
+
+def loop_product_stats(rows):
+    # The row-at-a-time version this replaces, kept only to measure against
+    totals = defaultdict(lambda: [0, 0.0, 0, 0.0])
+    for product, rating, day, incentivized in rows:
+        total = totals[product]
+        total[0] += 1
+        total[1] += rating
+        if incentivized:
+            total[2] += 1
+            total[3] += rating
+    return {
+        product: (total[1] / total[0], total[3] / total[2] if total[2] else None)
+        for product, total in totals.items()
+    }
+
+
+def write_synthetic_db(db_filename, columns):
+    # Only the tables and columns load_columns reads, filled from synthetic columns
+    connection = sqlite3.connect(db_filename)
+    connection.executescript("""
+        CREATE TABLE products (g2_url TEXT PRIMARY KEY, name TEXT);
+        CREATE TABLE product_keywords (g2_url TEXT, keyword TEXT, PRIMARY KEY (keyword, g2_url));
+        CREATE TABLE reviews (id INTEGER PRIMARY KEY, g2_url TEXT, date TEXT, rating REAL, validated INTEGER, incentivized INTEGER);
+    """)
+    urls = [f"https://www.g2.com/products/{name}" for name in columns.product_names]
+    connection.executemany("INSERT INTO products (g2_url, name) VALUES (?, ?)", zip(urls, columns.product_names))
+    connection.executemany(
+        "INSERT INTO product_keywords (g2_url, keyword) VALUES (?, ?)",
+        ((urls[product], columns.keywords[keyword]) for keyword, product in zip(columns.pair_keyword.tolist(), columns.pair_product.tolist()))
+    )
+    # Undated reviews are stored the way the scraper stores them
+    dates = np.where(columns.day >= 0, columns.day, 0).astype("datetime64[D]").astype(str)
+    dates[columns.day < 0] = "No date"
+    connection.executemany(
+        "INSERT INTO reviews (g2_url, date, rating, validated, incentivized) VALUES (?, ?, ?, ?, ?)",
+        zip(
+            (urls[product] for product in columns.product.tolist()), dates.tolist(), columns.rating.tolist(),
+            columns.validated.tolist(), columns.incentivized.tolist()
+        )
+    )
+    connection.commit()
+    connection.close()
+
+
+def bench_load(reviews=1_000_000, target=10_000_000):
+    columns = synthetic_columns(reviews)
+    with tempfile.TemporaryDirectory() as directory:
+        db_filename = os.path.join(directory, "bench.db")
+        started = time.perf_counter()
+        write_synthetic_db(db_filename, columns)
+        logger.info(f"Wrote {reviews} synthetic reviews to SQLite in {time.perf_counter() - started:.2f}s")
+
+        started = time.perf_counter()
+        loaded = load_columns(db_filename)
+        seconds = time.perf_counter() - started
+        # Timed and measured separately, tracemalloc slows every allocation down several times
+        tracemalloc.start()
+        load_columns(db_filename)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    # Undated reviews ("No date") must come back as -1 and every date must survive the round trip
+    assert len(loaded) == reviews and np.array_equal(np.sort(loaded.day), np.sort(columns.day))
+    logger.info(
+        f"load_columns: {seconds:.2f}s for {reviews} reviews ({reviews / seconds / 1e6:.2f}M rows/s, "
+        f"~{seconds * target / reviews:.0f}s at {target}), peak {peak / 2**20:.0f} MB "
+        f"(~{peak / reviews * target / 2**30:.1f} GB at {target})"
+    )
+
+
+def bench_analytics(reviews=10_000_000, loop_sample=1_000_000):
+    started = time.perf_counter()
+    columns = synthetic_columns(reviews)
+    generated = time.perf_counter()
+    logger.info(f"Generated {reviews} synthetic reviews in {generated - started:.2f}s")
+
+    started = time.perf_counter()
+    products, keywords, trends = analyze(columns)
+    vectorized = time.perf_counter() - started
+    logger.info(
+        f"Vectorized: {vectorized:.2f}s for {len(products['reviews'])} products, {len(keywords['reviews'])} keywords "
+        f"and {len(trends[0])} months ({reviews / vectorized / 1e6:.1f}M reviews/s)"
+    )
+
+    rows = list(zip(
+        columns.product[:loop_sample].tolist(), columns.rating[:loop_sample].tolist(),
+        columns.day[:loop_sample].tolist(), columns.incentivized[:loop_sample].tolist()
+    ))
+    started = time.perf_counter()
+    loop_product_stats(rows)
+    looped = (time.perf_counter() - started) * reviews / loop_sample
+    logger.info(
+        f"Python loop (averages only, extrapolated from {loop_sample} rows): {looped:.2f}s, "
+        f"{looped / vectorized:.1f}x slower"
+    )
+
+    memory = sum(array.nbytes for array in (columns.product, columns.rating, columns.day, columns.validated, columns.incentivized))
+    logger.info(f"Columnar storage: {memory / 2**20:.0f} MB ({memory / reviews:.0f} bytes per review)")
+
+
+if __name__ == "__main__":
+
+    REVIEW_DB = "reviews.db"
+    OUTPUT_PREFIX = "analytics"
+    BENCH_REVIEWS = 10_000_000
+    BENCH_LOAD_REVIEWS = 1_000_000
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("mode", nargs="?", default="analyze", choices=["analyze", "bench"])
+    parser.add_argument("--db", default=REVIEW_DB)
+    parser.add_argument("--output", default=OUTPUT_PREFIX)
+    parser.add_argument("--reviews", type=int, default=BENCH_REVIEWS)
+    parser.add_argument("--load-reviews", type=int, default=BENCH_LOAD_REVIEWS, help="rows written to SQLite to time load_columns")
+    args = parser.parse_args()
+
+    if np is None:
+        raise SystemExit("scraper-analytics.py needs numpy: pip install numpy")
+
+    if args.mode == "bench":
+        bench_analytics(args.reviews)
+        bench_load(args.load_reviews, target=args.reviews)
+    else:
+        run_analytics(args.db, args.output)
@@ -0,0 +1,120 @@
+import json
+import time
+import random
+import logging
+import argparse
+import threading
+import http.client
+from urllib.parse import quote
+
+
+## Logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def get_json(connection, path):
+    connection.request("GET", path)
+    response = connection.getresponse()
+    body = response.read()
+    return response.status, json.loads(body)
+
+
+def discover_paths(host, port, max_products=200):
+    # Build a realistic mix of request paths from what the API actually serves
+    connection = http.client.HTTPConnection(host, port, timeout=10)
+    paths = ["/keywords"]
+    _, payload = get_json(connection, "/keywords")
+    product_ids = []
+    for keyword in payload["keywords"]:
+        products_path = f"/keywords/{quote(keyword['keyword'])}/products"
+        paths.append(products_path)
+        _, products = get_json(connection, products_path)
+        product_ids.extend(product["id"] for product in products["products"])
+    for product_id in product_ids[:max_products]:
+        paths.append(f"/products/{product_id}")
+        paths.append(f"/products/{product_id}/reviews")
+        paths.append(f"/products/{product_id}/reviews?min_rating=4&limit=20")
+        paths.append(f"/products/{product_id}/reviews?incentivized=false&since=2023-01-01")
+    connection.close()
+    return paths
+
+
+def run_client(host, port, paths, deadline, latencies, errors, lock):
+    connection = http.client.HTTPConnection(host, port, timeout=10)
+    local_latencies = []
+    local_errors = 0
+    # Skewed choice so a few hot products dominate, like real traffic
+    weights = [1 / (rank + 1) for rank in range(len(paths))]
+    while time.perf_counter() < deadline:
+        path = random.choices(paths, weights=weights)[0]
+        started = time.perf_counter()
+        try:
+            status, _ = get_json(connection, path)
+            if status >= 500:
+                local_errors += 1
+        except (OSError, http.client.HTTPException, ValueError):
+            local_errors += 1
+            connection.close()
+            connection = http.client.HTTPConnection(host, port, timeout=10)
+            continue
+        local_latencies.append(time.perf_counter() - started)
+    connection.close()
+    with lock:
+        latencies.extend(local_latencies)
+        errors.append(local_errors)
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def load_test(host, port, clients, duration):
+    paths = discover_paths(host, port)
+    logger.info(f"Load testing {len(paths)} paths with {clients} clients for {duration}s")
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+    started = time.perf_counter()
+    threads = [
+        threading.Thread(target=run_client, args=(host, port, paths, deadline, latencies, errors, lock))
+        for _ in range(clients)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    report = {
+        "requests": len(latencies),
+        "errors": sum(errors),
+        "requests_per_second": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "max_ms": round((latencies[-1] if latencies else 0) * 1000, 2)
+    }
+    for name, value in report.items():
+        logger.info(f"{name}: {value}")
+    return report
+
+
+if __name__ == "__main__":
+
+    PORT = 8780
+    CLIENTS = 8
+    DURATION = 30
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--clients", type=int, default=CLIENTS)
+    parser.add_argument("--duration", type=int, default=DURATION)
+    args = parser.parse_args()
+
+    load_test(args.host, args.port, args.clients, args.duration)
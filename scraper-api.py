@@ -0,0 +1,290 @@
+import json
+import sqlite3
+import logging
+import argparse
+import threading
+from collections import OrderedDict
+from urllib.parse import urlsplit, parse_qs, unquote
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+## Logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+MAX_PAGE_SIZE = 500
+DEFAULT_PAGE_SIZE = 50
+
+
+class LRUCache:
+
+    def __init__(self, max_entries=1024):
+        self.lock = threading.Lock()
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+class ReviewReader:
+
+    def __init__(self, db_filename, cache_entries=1024):
+        self.db_filename = db_filename
+        self.local = threading.local()
+        self.cache = LRUCache(max_entries=cache_entries)
+        # data_version is only comparable on one connection, so a single one is kept just for it
+        self.version_connection = sqlite3.connect(f"file:{db_filename}?mode=ro", uri=True, check_same_thread=False)
+        self.data_version = None
+        # Bumped whenever the crawler commits, cache entries remember the one they were read under
+        self.generation = 0
+        self.version_lock = threading.Lock()
+
+    def connection(self):
+        # sqlite connections can't be shared between the server's threads
+        if not hasattr(self.local, "connection"):
+            self.local.connection = sqlite3.connect(f"file:{self.db_filename}?mode=ro", uri=True)
+            self.local.connection.row_factory = sqlite3.Row
+        return self.local.connection
+
+    def check_version(self):
+        # The crawler keeps writing while we serve, drop cached answers once it commits
+        # PRAGMA data_version changes on any other connection's commit and reads no table
+        with self.version_lock:
+            version = self.version_connection.execute("PRAGMA data_version").fetchone()[0]
+            if version != self.data_version:
+                self.data_version = version
+                self.generation += 1
+                self.cache.clear()
+
+    def cached(self, key, load):
+        # A load that started before a commit may finish after the clear, its entry is tagged stale
+        generation = self.generation
+        entry = self.cache.get(key)
+        if entry is not None and entry[0] == generation:
+            return entry[1]
+        value = load()
+        self.cache.put(key, (generation, value))
+        return value
+
+    def keywords(self):
+        return self.cached(("keywords",), lambda: [
+            dict(row) for row in self.connection().execute(
+                "SELECT keyword, COUNT(*) AS products FROM product_keywords GROUP BY keyword ORDER BY keyword"
+            )
+        ])
+
+    def products_for_keyword(self, keyword, limit, offset):
+        return self.cached(("products", keyword, limit, offset), lambda: [
+            dict(row) for row in self.connection().execute("""
+                SELECT p.rowid AS id, p.name, p.stars, p.g2_url, p.description
+                FROM product_keywords k
+                JOIN products p ON p.g2_url = k.g2_url
+                WHERE k.keyword = ?
+                ORDER BY p.name
+                LIMIT ? OFFSET ?
+            """, (keyword, limit, offset))
+        ])
+
+    def product(self, product_id):
+
+        def load():
+            row = self.connection().execute(
+                "SELECT rowid AS id, name, stars, g2_url, description FROM products WHERE rowid = ?", (product_id,)
+            ).fetchone()
+            if row is None:
+                return {}
+            product = dict(row)
+            product["keywords"] = [
+                keyword for (keyword,) in self.connection().execute(
+                    "SELECT keyword FROM product_keywords WHERE g2_url = ?", (product["g2_url"],)
+                )
+            ]
+            return product
+
+        return self.cached(("product", product_id), load) or None
+
+    def summary(self, scope, key):
+
+        def load():
+            row = self.connection().execute(
+                "SELECT summary FROM review_summaries WHERE scope = ? AND key = ?", (scope, key)
+            ).fetchone()
+            return json.loads(row[0]) if row else {}
+
+        totals = self.cached(("summary", scope, key), load)
+        count = totals.get("count", 0)
+        share = lambda value: round(value / count, 4) if count else 0.0
+        return {
+            "reviews": count,
+            "average_rating": round(totals["rating_total"] / count, 3) if count else None,
+            "histogram": dict(sorted(totals.get("histogram", {}).items(), key=lambda item: float(item[0]))),
+            "validated_share": share(totals.get("validated", 0)),
+            "incentivized_share": share(totals.get("incentivized", 0)),
+            "sources": totals.get("sources", {})
+        }
+
+    def reviews(self, product_id, filters, limit, offset):
+        product = self.product(product_id)
+        if product is None:
+            return None
+
+        clauses = ["g2_url = ?"]
+        params = [product["g2_url"]]
+        if "min_rating" in filters:
+            clauses.append("rating >= ?")
+            params.append(float(filters["min_rating"]))
+        if "max_rating" in filters:
+            clauses.append("rating <= ?")
+            params.append(float(filters["max_rating"]))
+        if "since" in filters:
+            clauses.append("date >= ?")
+            params.append(filters["since"])
+        if "until" in filters:
+            clauses.append("date <= ?")
+            params.append(filters["until"])
+        for flag in ("incentivized", "validated"):
+            if flag in filters:
+                clauses.append(f"{flag} = ?")
+                params.append(1 if filters[flag].lower() in ("1", "true", "yes") else 0)
+
+        key = ("reviews", product_id, tuple(sorted(filters.items())), limit, offset)
+        return self.cached(key, lambda: [
+            dict(row) for row in self.connection().execute(f"""
+                SELECT name, date, job_title, rating, full_review, review_source,
+                       validated, incentivized, content_hash, near_duplicate
+                FROM reviews
+                WHERE {" AND ".join(clauses)}
+                ORDER BY date DESC
+                LIMIT ? OFFSET ?
+            """, params + [limit, offset])
+        ])
+
+
+def page_params(query):
+    limit = min(int(query.get("limit", DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE)
+    offset = int(query.get("offset", 0))
+    return limit, offset
+
+
+def make_api_handler(reader):
+
+    class ApiHandler(BaseHTTPRequestHandler):
+        # Keep-alive so clients don't pay a TCP handshake per request
+        protocol_version = "HTTP/1.1"
+        # Headers and body go out as separate writes, Nagle would hold the body for a delayed ACK
+        disable_nagle_algorithm = True
+
+        def send_json(self, status, payload):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            url = urlsplit(self.path)
+            parts = [unquote(part) for part in url.path.strip("/").split("/") if part]
+            query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+            try:
+                reader.check_version()
+                limit, offset = page_params(query)
+
+                if parts == ["keywords"]:
+                    self.send_json(200, {"keywords": reader.keywords()})
+
+                elif len(parts) == 3 and parts[0] == "keywords" and parts[2] == "products":
+                    products = reader.products_for_keyword(parts[1], limit, offset)
+                    self.send_json(200, {
+                        "keyword": parts[1],
+                        "products": products,
+                        "next_offset": offset + limit if len(products) == limit else None
+                    })
+
+                elif len(parts) == 3 and parts[0] == "keywords" and parts[2] == "summary":
+                    self.send_json(200, {"keyword": parts[1], "summary": reader.summary("keyword", parts[1])})
+
+                elif len(parts) == 3 and parts[0] == "products" and parts[2] == "summary":
+                    product = reader.product(int(parts[1]))
+                    if product is None:
+                        self.send_json(404, {"error": "product not found"})
+                    else:
+                        self.send_json(200, {"product_id": product["id"], "summary": reader.summary("product", product["g2_url"])})
+
+                elif len(parts) == 2 and parts[0] == "products":
+                    product = reader.product(int(parts[1]))
+                    if product is None:
+                        self.send_json(404, {"error": "product not found"})
+                    else:
+                        self.send_json(200, product)
+
+                elif len(parts) == 3 and parts[0] == "products" and parts[2] == "reviews":
+                    filters = {key: value for key, value in query.items() if key not in ("limit", "offset")}
+                    reviews = reader.reviews(int(parts[1]), filters, limit, offset)
+                    if reviews is None:
+                        self.send_json(404, {"error": "product not found"})
+                    else:
+                        self.send_json(200, {
+                            "product_id": int(parts[1]),
+                            "reviews": reviews,
+                            "next_offset": offset + limit if len(reviews) == limit else None
+                        })
+
+                else:
+                    self.send_json(404, {"error": "not found"})
+
+            except ValueError as e:
+                self.send_json(400, {"error": str(e)})
+            except sqlite3.Error as e:
+                logger.error(f"Query failed for {self.path}: {e}")
+                self.send_json(500, {"error": "storage error"})
+
+        def log_message(self, format, *args):
+            logger.debug(format % args)
+
+    return ApiHandler
+
+
+if __name__ == "__main__":
+
+    REVIEW_DB = "reviews.db"
+    PORT = 8780
+    CACHE_ENTRIES = 1024
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--db", default=REVIEW_DB)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=PORT)
+    args = parser.parse_args()
+
+    reader = ReviewReader(args.db, cache_entries=CACHE_ENTRIES)
+    server = ThreadingHTTPServer((args.host, args.port), make_api_handler(reader))
+    logger.info(f"Serving {args.db} on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        logger.info(f"Cache hits {reader.cache.hits}, misses {reader.cache.misses}")
@@ -0,0 +1,427 @@
+import os
+import csv
+import sys
+import json
+import time
+import uuid
+import socket
+import logging
+import argparse
+import threading
+import importlib.util
+import urllib.request
+import concurrent.futures
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+## Logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+## Scraper
+def load_scraper(path="scraper-proxy.py"):
+    # Hyphenated filename, so loaded by path; reused if another script already loaded it
+    if "scraper_proxy" in sys.modules:
+        return sys.modules["scraper_proxy"]
+    spec = importlib.util.spec_from_file_location("scraper_proxy", os.path.join(os.path.dirname(os.path.abspath(__file__)), path))
+    scraper = importlib.util.module_from_spec(spec)
+    sys.modules["scraper_proxy"] = scraper
+    spec.loader.exec_module(scraper)
+    return scraper
+
+
+scraper = load_scraper()
+
+
+## Work queue
+class LeaseQueue:
+
+    def __init__(self, lease_seconds=300, max_attempts=4):
+        self.lock = threading.Lock()
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.pending = deque()
+        self.leases = {}
+        self.attempts = {}
+        self.done = set()
+        self.dead = {}
+
+    def put(self, job):
+        with self.lock:
+            self.pending.append(job)
+
+    def requeue_expired(self):
+        # Same rule as fail(): a job whose worker keeps dying is only re-issued max_attempts times
+        # Returns the jobs that just failed for good
+        now = time.time()
+        dead = []
+        with self.lock:
+            for lease_id, lease in list(self.leases.items()):
+                if lease["expires"] >= now:
+                    continue
+                del self.leases[lease_id]
+                job = lease["job"]
+                if self.attempts.get(job["job_id"], 0) >= self.max_attempts:
+                    logger.error(f"Job {job['job_id']} failed permanently: lease expired on its last attempt (worker {lease['worker']})")
+                    self.dead[job["job_id"]] = "lease expired"
+                    dead.append(job)
+                    continue
+                logger.warning(f"Lease {lease_id} on {job['job_id']} expired (worker {lease['worker']}), re-issuing")
+                self.pending.appendleft(job)
+        return dead
+
+    def lease(self, worker_id):
+        with self.lock:
+            while self.pending:
+                job = self.pending.popleft()
+                if job["job_id"] in self.done or job["job_id"] in self.dead:
+                    continue
+                lease_id = uuid.uuid4().hex
+                self.attempts[job["job_id"]] = self.attempts.get(job["job_id"], 0) + 1
+                self.leases[lease_id] = {
+                    "job": job,
+                    "worker": worker_id,
+                    "expires": time.time() + self.lease_seconds
+                }
+                return {"lease_id": lease_id, "lease_seconds": self.lease_seconds, "job": job}
+        return None
+
+    def heartbeat(self, lease_id):
+        with self.lock:
+            lease = self.leases.get(lease_id)
+            if lease is None:
+                return False
+            lease["expires"] = time.time() + self.lease_seconds
+            return True
+
+    def complete(self, lease_id):
+        with self.lock:
+            lease = self.leases.pop(lease_id, None)
+            if lease is None or lease["job"]["job_id"] in self.done:
+                return None
+            self.done.add(lease["job"]["job_id"])
+            return lease["job"]
+
+    def fail(self, lease_id, error):
+        # Returns the job only once it has failed for good
+        with self.lock:
+            lease = self.leases.pop(lease_id, None)
+            if lease is None:
+                return None
+            job = lease["job"]
+            if self.attempts.get(job["job_id"], 0) >= self.max_attempts:
+                logger.error(f"Job {job['job_id']} failed permanently: {error}")
+                self.dead[job["job_id"]] = error
+                return job
+            logger.warning(f"Job {job['job_id']} failed on {lease['worker']}, requeueing: {error}")
+            self.pending.append(job)
+            return None
+
+    def cancel(self, job_id):
+        with self.lock:
+            if job_id in self.done or job_id in self.dead:
+                return False
+            self.done.add(job_id)
+            return True
+
+    def is_idle(self):
+        with self.lock:
+            return not self.pending and not self.leases
+
+    def status(self):
+        with self.lock:
+            return {
+                "pending": len(self.pending),
+                "leased": len(self.leases),
+                "done": len(self.done),
+                "dead": len(self.dead)
+            }
+
+
+class Coordinator:
+
+    def __init__(self, keyword_list, pages, lease_seconds=300, max_attempts=4):
+        self.queue = LeaseQueue(lease_seconds=lease_seconds, max_attempts=max_attempts)
+        self.lock = threading.Lock()
+        self.crawl_pipelines = {}
+        self.search_jobs_left = {}
+        self.finished = threading.Event()
+        self.aggregate_files = []
+        self.product_registry = scraper.ProductRegistry()
+
+        self.max_pages = pages
+        self.page_counts = {}
+
+        for keyword in keyword_list:
+            filename = keyword.replace(" ", "-")
+            # Results for one keyword arrive on concurrent handler threads, so the pipeline must lock
+            self.crawl_pipelines[keyword] = scraper.StreamingPipeline(csv_filename=f"{filename}.csv", on_flush=scraper.store.product_indexer(keyword))
+            # Page 1 reports how many more pages to queue
+            self.search_jobs_left[keyword] = 1
+            self.queue.put(self.search_job(keyword, 0))
+
+    def search_job(self, keyword, page):
+        return {
+            "job_id": f"search:{keyword}:{page}",
+            "type": "search",
+            "keyword": keyword,
+            "page": page
+        }
+
+    def finish_search(self, keyword):
+        with self.lock:
+            self.search_jobs_left[keyword] -= 1
+            keyword_done = self.search_jobs_left[keyword] == 0
+        if keyword_done:
+            self.crawl_pipelines[keyword].close_pipeline()
+            logger.info(f"Search crawl complete for {keyword}")
+            self.enqueue_products(keyword)
+
+    def enqueue_products(self, keyword):
+        csv_file = self.crawl_pipelines[keyword].csv_filename
+        self.aggregate_files.append(csv_file)
+        if not os.path.isfile(csv_file):
+            logger.warning(f"No results written for {keyword}")
+            return
+        with open(csv_file, newline="") as file:
+            for row in csv.DictReader(file):
+                if not self.product_registry.register(row["g2_url"], keyword, row["name"]):
+                    continue
+                self.queue.put({
+                    "job_id": f"product:{row['g2_url']}",
+                    "type": "product",
+                    "keyword": keyword,
+                    "row": row
+                })
+
+    def complete(self, lease_id, results):
+        job = self.queue.complete(lease_id)
+        if job is None:
+            # Late result for a lease that was already re-issued, finished or cancelled
+            self.check_finished()
+            return False
+
+        if job["type"] == "search":
+            keyword = job["keyword"]
+            crawl_pipeline = self.crawl_pipelines[keyword]
+            new_items = 0
+            for item in results["items"]:
+                if crawl_pipeline.add_data(scraper.SearchData(**item)):
+                    new_items += 1
+            exhausted = new_items == 0
+
+            if job["page"] == 0:
+                page_count = scraper.pages_to_fetch(
+                    {"exhausted": exhausted, "page_count": results["page_count"]}, self.max_pages
+                )
+                with self.lock:
+                    self.page_counts[keyword] = page_count
+                    self.search_jobs_left[keyword] += page_count - 1
+                for page in range(1, page_count):
+                    self.queue.put(self.search_job(keyword, page))
+            elif exhausted:
+                # Drop the pages past the end of the listing that nobody has leased yet
+                logger.info(f"{keyword}: page {job['page']+1} had no new products, stopping")
+                for page in range(job["page"] + 1, self.page_counts[keyword]):
+                    if self.queue.cancel(self.search_job(keyword, page)["job_id"]):
+                        self.finish_search(keyword)
+            self.finish_search(keyword)
+        else:
+            review_pipeline = scraper.product_review_pipeline(job["row"])
+            for item in results:
+                review_pipeline.add_data(scraper.ReviewData(**item))
+            review_pipeline.close_pipeline()
+            logger.info(f"Successfully parsed: {job['row']['g2_url']}")
+        self.check_finished()
+        return True
+
+    def lease(self, worker_id):
+        self.requeue_expired()
+        return self.queue.lease(worker_id)
+
+    def requeue_expired(self):
+        for job in self.queue.requeue_expired():
+            if job["type"] == "search":
+                self.finish_search(job["keyword"])
+        self.check_finished()
+
+    def fail(self, lease_id, error):
+        job = self.queue.fail(lease_id, error)
+        if job is not None and job["type"] == "search":
+            self.finish_search(job["keyword"])
+        self.check_finished()
+
+    def check_finished(self):
+        with self.lock:
+            searches_done = all(left <= 0 for left in self.search_jobs_left.values())
+        if searches_done and self.queue.is_idle() and not self.finished.is_set():
+            self.product_registry.save()
+            self.finished.set()
+
+
+def make_coordinator_handler(coordinator):
+
+    class CoordinatorHandler(BaseHTTPRequestHandler):
+
+        def send_json(self, status, payload=None):
+            body = json.dumps(payload).encode("utf-8") if payload is not None else b""
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == "/status":
+                self.send_json(200, coordinator.queue.status())
+            else:
+                self.send_json(404, {"error": "not found"})
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            payload = json.loads(self.rfile.read(length) or b"{}")
+
+            if self.path == "/lease":
+                lease = coordinator.lease(payload.get("worker_id", "unknown"))
+                if lease is None:
+                    self.send_json(200, {"job": None, "finished": coordinator.finished.is_set()})
+                else:
+                    self.send_json(200, lease)
+            elif self.path == "/heartbeat":
+                self.send_json(200, {"ok": coordinator.queue.heartbeat(payload["lease_id"])})
+            elif self.path == "/complete":
+                self.send_json(200, {"ok": coordinator.complete(payload["lease_id"], payload.get("results", []))})
+            elif self.path == "/fail":
+                coordinator.fail(payload["lease_id"], payload.get("error", ""))
+                self.send_json(200, {"ok": True})
+            else:
+                self.send_json(404, {"error": "not found"})
+
+        def log_message(self, format, *args):
+            logger.debug(format % args)
+
+    return CoordinatorHandler
+
+
+def run_coordinator(keyword_list, pages, host="0.0.0.0", port=8765, lease_seconds=300, max_attempts=4):
+    coordinator = Coordinator(keyword_list, pages, lease_seconds=lease_seconds, max_attempts=max_attempts)
+    server = ThreadingHTTPServer((host, port), make_coordinator_handler(coordinator))
+    server_thread = threading.Thread(target=server.serve_forever, daemon=True)
+    server_thread.start()
+    logger.info(f"Coordinator listening on {host}:{port}")
+
+    while not coordinator.finished.wait(timeout=lease_seconds / 4):
+        coordinator.requeue_expired()
+        logger.info(f"Queue status: {coordinator.queue.status()}")
+
+    # Give idle workers one poll interval to see the finished flag
+    time.sleep(5)
+    server.shutdown()
+    logger.info(f"Crawl complete. Queue status: {coordinator.queue.status()}")
+    return coordinator
+
+
+def post_json(url, payload, timeout=30):
+    request = urllib.request.Request(
+        url,
+        data=json.dumps(payload).encode("utf-8"),
+        headers={"Content-Type": "application/json"}
+    )
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return json.loads(response.read() or b"{}")
+
+
+def run_job(job, location, retries=3):
+    if job["type"] == "search":
+        collector = scraper.CollectorPipeline()
+        result = scraper.scrape_search_results(
+            job["keyword"], location, job["page"], data_pipeline=collector, retries=retries, detect_pages=job["page"] == 0
+        )
+        collector.close_pipeline()
+        return {"items": [item.to_dict() for item in collector.items], "page_count": result["page_count"]}
+
+    attempts = []
+
+    def make_collector(row):
+        attempts.append(scraper.CollectorPipeline())
+        return attempts[-1]
+
+    scraper.process_business(job["row"], location, retries=retries, pipeline_factory=make_collector)
+    return [item.to_dict() for item in attempts[-1].items]
+
+
+def run_worker(coordinator_url, location, worker_id=None, retries=3, poll_interval=5):
+    worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}-{threading.get_ident()}"
+    logger.info(f"Worker {worker_id} polling {coordinator_url}")
+
+    while True:
+        try:
+            lease = post_json(f"{coordinator_url}/lease", {"worker_id": worker_id})
+        except OSError as e:
+            logger.warning(f"Coordinator unreachable: {e}")
+            time.sleep(poll_interval)
+            continue
+
+        job = lease.get("job")
+        if job is None:
+            if lease.get("finished"):
+                logger.info(f"Worker {worker_id} finished")
+                return
+            time.sleep(poll_interval)
+            continue
+
+        lease_id = lease["lease_id"]
+        stop_heartbeat = threading.Event()
+
+        def heartbeat():
+            while not stop_heartbeat.wait(timeout=lease["lease_seconds"] / 3):
+                try:
+                    post_json(f"{coordinator_url}/heartbeat", {"lease_id": lease_id})
+                except OSError as e:
+                    logger.warning(f"Heartbeat failed for {job['job_id']}: {e}")
+
+        heartbeat_thread = threading.Thread(target=heartbeat, daemon=True)
+        heartbeat_thread.start()
+        try:
+            results = run_job(job, location, retries=retries)
+            post_json(f"{coordinator_url}/complete", {"lease_id": lease_id, "results": results})
+        except Exception as e:
+            logger.error(f"Job {job['job_id']} failed: {e}")
+            try:
+                post_json(f"{coordinator_url}/fail", {"lease_id": lease_id, "error": str(e)})
+            except OSError:
+                pass
+        finally:
+            stop_heartbeat.set()
+            heartbeat_thread.join()
+
+
+if __name__ == "__main__":
+
+    MAX_RETRIES = 3
+    MAX_THREADS = 5
+    PAGES = 50  # upper bound, the listing's own page count is read from page 1
+    LOCATION = "us"
+    COORDINATOR_PORT = 8765
+    LEASE_SECONDS = 300
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("mode", choices=["coordinator", "worker"])
+    parser.add_argument("--coordinator", default=f"http://localhost:{COORDINATOR_PORT}")
+    parser.add_argument("--port", type=int, default=COORDINATOR_PORT)
+    parser.add_argument("--threads", type=int, default=MAX_THREADS)
+    args = parser.parse_args()
+
+    ## INPUT ---> List of keywords to scrape
+    keyword_list = ["online bank"]
+
+    if args.mode == "coordinator":
+        run_coordinator(keyword_list, PAGES, port=args.port, lease_seconds=LEASE_SECONDS, max_attempts=MAX_RETRIES + 1)
+
+    else:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=args.threads) as executor:
+            for _ in range(args.threads):
+                executor.submit(run_worker, args.coordinator, LOCATION, retries=MAX_RETRIES)
+        scraper.finish_run()
@@ -0,0 +1,314 @@
+import os
+import sys
+import json
+import time
+import signal
+import sqlite3
+import logging
+import argparse
+import threading
+import importlib.util
+import concurrent.futures
+from collections import Counter
+
+
+## Logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+## Scraper
+def load_scraper(path="scraper-proxy.py"):
+    # Hyphenated filename, so loaded by path; reused if another script already loaded it
+    if "scraper_proxy" in sys.modules:
+        return sys.modules["scraper_proxy"]
+    spec = importlib.util.spec_from_file_location("scraper_proxy", os.path.join(os.path.dirname(os.path.abspath(__file__)), path))
+    scraper = importlib.util.module_from_spec(spec)
+    sys.modules["scraper_proxy"] = scraper
+    spec.loader.exec_module(scraper)
+    return scraper
+
+
+scraper = load_scraper()
+
+
+## Recrawl scheduling
+CATALOG_DB = "crawl-catalog.db"
+MIN_RECRAWL_HOURS = 6  # never revisit sooner than this, however busy the item looks
+MAX_RECRAWL_HOURS = 24 * 7  # always revisit within this, however quiet the item looks
+CHANGE_RATE_ALPHA = 0.3  # weight of the latest observation in the change-rate average
+STALENESS_FLOOR = 0.1  # changes/day assumed even for items that never change
+MAINTENANCE_INTERVAL = 600
+
+
+class CrawlCatalog:
+
+    def __init__(self, db_filename=CATALOG_DB):
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(db_filename, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        with self.lock, self.connection:
+            self.connection.execute("""
+                CREATE TABLE IF NOT EXISTS catalog (
+                    kind TEXT,
+                    key TEXT,
+                    location TEXT,
+                    payload TEXT,
+                    last_crawled REAL DEFAULT 0,
+                    change_rate REAL DEFAULT 0,
+                    crawls INTEGER DEFAULT 0,
+                    failures INTEGER DEFAULT 0,
+                    PRIMARY KEY (kind, key, location)
+                )
+            """)
+
+    def add(self, kind, key, location, payload):
+        # True only for items the catalog has never seen
+        with self.lock, self.connection:
+            cursor = self.connection.execute(
+                "INSERT OR IGNORE INTO catalog (kind, key, location, payload) VALUES (?, ?, ?, ?)",
+                (kind, key, location, json.dumps(payload))
+            )
+            if cursor.rowcount > 0:
+                return True
+            # Seen again, keep the latest payload (e.g. the search card's stars the fingerprint check reads)
+            self.connection.execute(
+                "UPDATE catalog SET payload = ? WHERE kind = ? AND key = ? AND location = ?",
+                (json.dumps(payload), kind, key, location)
+            )
+            return False
+
+    def due(self, now, limit, exclude=()):
+        # Never-crawled first, then overdue, then expected changes since the last visit
+        with self.lock:
+            rows = self.connection.execute("""
+                SELECT kind, key, location, payload FROM catalog
+                WHERE last_crawled <= ?
+                ORDER BY
+                    CASE
+                        WHEN last_crawled = 0 THEN 2
+                        WHEN last_crawled <= ? THEN 1
+                        ELSE 0
+                    END DESC,
+                    (? - last_crawled) / 86400.0 * (change_rate + ?) DESC
+                LIMIT ?
+            """, (
+                now - MIN_RECRAWL_HOURS * 3600, now - MAX_RECRAWL_HOURS * 3600,
+                now, STALENESS_FLOOR, limit + len(exclude)
+            )).fetchall()
+        due = [(kind, key, location, json.loads(payload)) for kind, key, location, payload in rows if (kind, key, location) not in exclude]
+        return due[:limit]
+
+    def record(self, kind, key, location, changes, ok=True, now=None):
+        now = now or time.time()
+        with self.lock, self.connection:
+            last_crawled, change_rate, crawls = self.connection.execute(
+                "SELECT last_crawled, change_rate, crawls FROM catalog WHERE kind = ? AND key = ? AND location = ?",
+                (kind, key, location)
+            ).fetchone()
+            if ok:
+                # A first crawl finds everything at once, that says nothing about churn
+                if crawls:
+                    observed = changes / max((now - last_crawled) / 86400, MIN_RECRAWL_HOURS / 24)
+                    change_rate = CHANGE_RATE_ALPHA * observed + (1 - CHANGE_RATE_ALPHA) * change_rate
+                self.connection.execute(
+                    "UPDATE catalog SET last_crawled = ?, change_rate = ?, crawls = crawls + 1"
+                    " WHERE kind = ? AND key = ? AND location = ?",
+                    (now, change_rate, kind, key, location)
+                )
+            else:
+                # Back off like a normal visit so a broken item can't hog the budget
+                self.connection.execute(
+                    "UPDATE catalog SET last_crawled = ?, failures = failures + 1 WHERE kind = ? AND key = ? AND location = ?",
+                    (now, kind, key, location)
+                )
+
+    def stats(self):
+        with self.lock:
+            return {
+                kind: {"items": items, "never_crawled": never, "avg_change_rate": round(rate or 0, 3)}
+                for kind, items, never, rate in self.connection.execute(
+                    "SELECT kind, COUNT(*), SUM(last_crawled = 0), AVG(change_rate) FROM catalog GROUP BY kind"
+                )
+            }
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+
+class PageBudget:
+
+    def __init__(self, pages_per_hour):
+        # Token bucket that may go into debt, since a job's page count is only known afterwards
+        self.lock = threading.Lock()
+        self.rate = pages_per_hour / 3600
+        self.capacity = max(pages_per_hour / 60, 1)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait(self, stop):
+        while not stop.is_set():
+            with self.lock:
+                self.refill()
+                if self.tokens > 0:
+                    return True
+                delay = -self.tokens / self.rate
+            stop.wait(timeout=min(delay, 60))
+        return False
+
+    def spend(self, pages):
+        with self.lock:
+            self.refill()
+            self.tokens -= pages
+
+
+class CrawlDaemon:
+
+    def __init__(self, catalog, pages, max_threads=5, retries=3, pages_per_hour=600, idle_interval=60):
+        self.catalog = catalog
+        self.pages = pages
+        self.max_threads = max_threads
+        self.retries = retries
+        self.budget = PageBudget(pages_per_hour)
+        self.idle_interval = idle_interval
+        self.stop = threading.Event()
+        self.in_flight = {}
+        self.counts_lock = threading.Lock()
+        self.counts = Counter()
+
+    def seed(self, keywords, locations):
+        for keyword in keywords:
+            for location in locations:
+                self.catalog.add("keyword", keyword, location, {"keyword": keyword})
+
+    def crawl_keyword(self, keyword, location):
+        new_products = 0
+
+        def on_accept(search_data):
+            nonlocal new_products
+            row = search_data.to_dict()
+            if self.catalog.add("product", scraper.store.normalize_product_url(search_data.g2_url), location, row):
+                new_products += 1
+
+        # Products live in the catalog and the review store, a CSV would grow by one listing every cycle
+        pipeline = scraper.StreamingPipeline(on_accept=on_accept, on_flush=scraper.store.product_indexer(keyword))
+        first_page = scraper.scrape_search_results(keyword, location, 0, pipeline, self.retries, detect_pages=True)
+        page_count = scraper.pages_to_fetch(first_page, self.pages)
+        fetched = 1
+        for page_number in range(1, page_count):
+            if self.stop.is_set():
+                break
+            result = scraper.scrape_search_results(keyword, location, page_number, pipeline, self.retries)
+            fetched += 1
+            if result["exhausted"]:
+                break
+        pipeline.close_pipeline()
+        return new_products, fetched
+
+    def crawl_product(self, row, location):
+        added = 0
+
+        def count_added(reviews):
+            nonlocal added
+            added += scraper.store.get_review_store().add_reviews(row, reviews)
+
+        scraper.process_business(row, location, self.retries, check_fingerprint=True, skip_unchanged=True, pipeline_factory=lambda row: scraper.product_review_pipeline(row, on_flush=count_added))
+        return added, 1
+
+    def run_item(self, kind, key, location, payload):
+        started = time.time()
+        try:
+            if kind == "keyword":
+                changes, pages = self.crawl_keyword(payload["keyword"], location)
+            else:
+                changes, pages = self.crawl_product(payload, location)
+            self.catalog.record(kind, key, location, changes)
+            self.budget.spend(pages)
+            with self.counts_lock:
+                self.counts[f"{kind}_crawled"] += 1
+                self.counts[f"{kind}_changes"] += changes
+            scraper.METRICS.record("daemon_crawl", kind=kind, key=key, changes=changes, pages=pages, seconds=time.time() - started)
+        except Exception as e:
+            logger.error(f"Daemon {kind} crawl failed for {key}: {e}")
+            self.catalog.record(kind, key, location, 0, ok=False)
+            self.budget.spend(1)
+            with self.counts_lock:
+                self.counts[f"{kind}_failed"] += 1
+
+    def maintenance(self):
+        # Drivers are recycled by the pool, this catches anything that slipped through
+        scraper.reap_orphaned_browsers()
+        scraper.DRIVER_POOL.log_memory_summary()
+        rss_mb = scraper.process_rss_mb(os.getpid())
+        scraper.METRICS.record("daemon_memory", rss_mb=rss_mb, in_flight=len(self.in_flight))
+        with self.counts_lock:
+            counts = dict(self.counts)
+        logger.info(f"Daemon: {counts}, catalog {self.catalog.stats()}, {rss_mb:.0f} MB RSS")
+
+    def handle_signal(self, signum, frame):
+        logger.info(f"Signal {signum} received, finishing in-flight crawls")
+        self.stop.set()
+
+    def run(self):
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, self.handle_signal)
+        last_maintenance = time.monotonic()
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_threads, thread_name_prefix="daemon") as executor:
+            while not self.stop.is_set():
+                for future in [future for future in self.in_flight if future.done()]:
+                    del self.in_flight[future]
+
+                if time.monotonic() - last_maintenance >= MAINTENANCE_INTERVAL:
+                    self.maintenance()
+                    last_maintenance = time.monotonic()
+
+                free = self.max_threads - len(self.in_flight)
+                due = self.catalog.due(time.time(), free, exclude=set(self.in_flight.values())) if free else []
+                if not due:
+                    if self.in_flight:
+                        concurrent.futures.wait(self.in_flight, timeout=self.idle_interval, return_when=concurrent.futures.FIRST_COMPLETED)
+                    else:
+                        self.stop.wait(timeout=self.idle_interval)
+                    continue
+
+                for kind, key, location, payload in due:
+                    if not self.budget.wait(self.stop):
+                        break
+                    future = executor.submit(self.run_item, kind, key, location, payload)
+                    self.in_flight[future] = (kind, key, location)
+
+            concurrent.futures.wait(self.in_flight)
+        self.maintenance()
+
+
+if __name__ == "__main__":
+
+    MAX_RETRIES = 3
+    MAX_THREADS = 5
+    PAGES = 50  # upper bound, the listing's own page count is read from page 1
+    LOCATION = "us"
+    PAGES_PER_HOUR = 600  # throughput budget, proxy credits are charged per page
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--threads", type=int, default=MAX_THREADS)
+    parser.add_argument("--pages-per-hour", type=int, default=PAGES_PER_HOUR, help="page fetch budget")
+    parser.add_argument("--catalog", default=CATALOG_DB)
+    args = parser.parse_args()
+
+    ## INPUT ---> List of keywords to scrape
+    keyword_list = ["online bank"]
+    location_list = [LOCATION]
+
+    catalog = CrawlCatalog(args.catalog)
+    daemon = CrawlDaemon(catalog, PAGES, max_threads=args.threads, retries=MAX_RETRIES, pages_per_hour=args.pages_per_hour)
+    daemon.seed(keyword_list, location_list)
+    daemon.run()
+    catalog.close()
+    scraper.finish_run()
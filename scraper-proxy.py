@@ -1,16 +1,90 @@
 import os
+import sys
 import csv
+import re
 import json
+import math
+import bisect
+import hashlib
+import operator
+import time
+import uuid
+import signal
+import shutil
 import logging
+import argparse
+import threading
+import contextlib
+import importlib.util
+from array import array
+from collections import Counter, OrderedDict, defaultdict, deque
 from urllib.parse import urlencode
 import concurrent.futures
 from selenium import webdriver
 from selenium.webdriver.common.by import By
-from dataclasses import dataclass, field, fields, asdict
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.common.exceptions import TimeoutException
+from dataclasses import dataclass, fields
 
 OPTIONS = webdriver.ChromeOptions()
 OPTIONS.add_argument("--headless")
 
+## Page readiness
+# "eager" returns at DOMContentLoaded, "none" as soon as navigation commits;
+# either way we then wait only for the selector the parser needs.
+PAGE_LOAD_STRATEGY = "eager"
+READY_TIMEOUT = 10
+
+READY_SELECTORS = {
+    "search": "div[class='product-listing mb-1 border-bottom']",
+    "product": "div[itemprop='reviewBody']"
+}
+
+## Timeouts (seconds) per phase of a job
+TIMEOUTS = {
+    "page_load": 30,
+    "script": 10,
+    "job": 120
+}
+REAP_INTERVAL = 60
+
+## Driver recycling
+DRIVER_MAX_PAGES = 50
+DRIVER_MAX_RSS_MB = 1024
+
+## Resource blocking
+BLOCK_PROFILE = "g2"
+MEASURE_PAGE_BYTES = True
+
+BLOCK_PROFILES = {
+    "none": {
+        "prefs": {},
+        "blocked_urls": []
+    },
+    "g2": {
+        "prefs": {
+            "profile.managed_default_content_settings.images": 2,
+            "profile.managed_default_content_settings.stylesheets": 2,
+            "profile.managed_default_content_settings.fonts": 2,
+            "profile.managed_default_content_settings.media_stream": 2,
+            "profile.managed_default_content_settings.notifications": 2,
+            "profile.managed_default_content_settings.geolocation": 2,
+            "profile.managed_default_content_settings.popups": 2
+        },
+        "blocked_urls": [
+            "*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.svg", "*.ico",
+            "*.woff", "*.woff2", "*.ttf", "*.otf", "*.css",
+            "*.mp4", "*.webm",
+            "*google-analytics.com*", "*googletagmanager.com*", "*doubleclick.net*",
+            "*googlesyndication.com*", "*facebook.net*", "*connect.facebook*",
+            "*hotjar.com*", "*segment.com*", "*segment.io*", "*clarity.ms*",
+            "*bat.bing.com*", "*linkedin.com/px*", "*snap.licdn.com*",
+            "*cookielaw.org*", "*onetrust.com*", "*adroll.com*", "*quantserve.com*",
+            "*intercom.io*", "*drift.com*", "*6sc.co*", "*demandbase.com*"
+        ]
+    }
+}
+
 API_KEY = ""
 
 with open("config.json", "r") as config_file:
@@ -19,12 +93,22 @@ with open("config.json", "r") as config_file:
 
 
 
-def get_scrapeops_url(url, location="us"):
+## Proxy routes tried in turn when a fetch comes back blocked or broken
+PROXY_ROUTES = [
+    {"name": "default", "params": {}},
+    {"name": "residential", "params": {"residential": "true"}},
+    {"name": "bypass", "params": {"bypass": "generic_level_1"}}
+]
+
+
+def get_scrapeops_url(url, location="us", route=None):
     payload = {
         "api_key": API_KEY,
         "url": url,
-        "country": "us",
+        "country": location,
         }
+    if route:
+        payload.update(route["params"])
     proxy_url = "https://proxy.scrapeops.io/v1/?" + urlencode(payload)
     return proxy_url
 
@@ -34,31 +118,607 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+## Sibling scripts
+def load_module(name, filename):
+    # The scripts have hyphenated names, so they are loaded by path, once per process
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.spec_from_file_location(name, os.path.join(os.path.dirname(os.path.abspath(__file__)), filename))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
 
-@dataclass
-class SearchData:
-    name: str = ""
-    stars: float = 0
-    g2_url: str = ""
-    description: str = ""
+
+# Review store, FTS index and summaries
+store = load_module("scraper_store", "scraper-store.py")
+
+
+## Run metrics
+class RunMetrics:
+
+    def __init__(self, filename=""):
+        self.lock = threading.Lock()
+        self.filename = filename
+        self.counters = Counter()
+        # count, total, max per sample name, so a long-running process doesn't keep every value
+        self.samples = defaultdict(lambda: [0, 0.0, float("-inf")])
+
+    def incr(self, name, amount=1):
+        with self.lock:
+            self.counters[name] += amount
+
+    def observe(self, name, value):
+        with self.lock:
+            sample = self.samples[name]
+            sample[0] += 1
+            sample[1] += value
+            sample[2] = max(sample[2], value)
+
+    def record(self, event, **values):
+        if not self.filename:
+            return
+        line = json.dumps({"event": event, "ts": time.time(), **values})
+        with self.lock:
+            with open(self.filename, mode="a", encoding="utf-8") as metrics_file:
+                metrics_file.write(line + "\n")
+
+    def summary(self):
+        with self.lock:
+            summary = {"counters": dict(self.counters)}
+            for name, (count, total, peak) in self.samples.items():
+                summary[name] = {
+                    "count": count,
+                    "mean": total / count,
+                    "max": peak
+                }
+            return summary
+
+    def log_summary(self):
+        for name, value in self.summary().items():
+            logger.info(f"{name}: {value}")
+
+
+METRICS = RunMetrics(filename="run-metrics.jsonl")
+
+
+## Browser process management
+BROWSER_PROCESS_NAMES = ("chrome", "chromedriver", "chrome_crashpad", "headless_shell")
+
+
+def read_process_table():
+    # pid -> (ppid, name, uid) from /proc; empty where /proc isn't available
+    table = {}
+    if not os.path.isdir("/proc"):
+        return table
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", "r") as stat_file:
+                stat = stat_file.read()
+            uid = os.stat(f"/proc/{entry}").st_uid
+        except OSError:
+            continue
+        # The name is wrapped in parentheses and may itself contain spaces
+        name = stat[stat.index("(") + 1:stat.rindex(")")]
+        ppid = int(stat[stat.rindex(")") + 2:].split()[1])
+        table[int(entry)] = (ppid, name, uid)
+    return table
+
+
+def process_tree(pid, table=None):
+    table = table if table is not None else read_process_table()
+    tree = [pid]
+    for parent in tree:
+        tree.extend(child for child, (ppid, _, _) in table.items() if ppid == parent)
+    return tree
+
+
+def kill_processes(pids):
+    killed = 0
+    for pid in reversed(pids):
+        try:
+            os.kill(pid, signal.SIGKILL)
+            killed += 1
+        except OSError:
+            pass
+    return killed
+
+
+def is_automated_browser(pid, name):
+    if not any(name.startswith(browser) for browser in BROWSER_PROCESS_NAMES):
+        return False
+    if name.startswith("chromedriver"):
+        return True
+    # Leave someone's desktop Chrome alone, only touch Selenium-launched ones
+    try:
+        with open(f"/proc/{pid}/cmdline", "rb") as cmdline_file:
+            cmdline = cmdline_file.read()
+    except OSError:
+        return False
+    return b"--enable-automation" in cmdline or b"--headless" in cmdline
+
+
+# chromedriver PIDs this process launched, and how many launches are in progress
+live_driver_pids = set()
+starting_drivers = 0
+driver_pids_lock = threading.Lock()
+
+
+def register_driver(driver):
+    service_process = getattr(getattr(driver, "service", None), "process", None)
+    if service_process is not None:
+        with driver_pids_lock:
+            live_driver_pids.add(service_process.pid)
+
+
+def reap_orphaned_browsers():
+    # Chrome/chromedriver re-parented to init belong to a driver that is gone
+    table = read_process_table()
+    uid = os.getuid()
+    with driver_pids_lock:
+        # A chromedriver mid-launch isn't registered yet and can't be told apart from an orphan
+        if starting_drivers:
+            return 0
+        live_driver_pids.intersection_update(table)
+        live = set(live_driver_pids)
+    # Our own drivers also have ppid 1 when this process is init, e.g. in a container
+    protected = {pid for driver_pid in live for pid in process_tree(driver_pid, table)}
+    orphans = [
+        pid for pid, (ppid, name, owner) in table.items()
+        if ppid == 1 and owner == uid and pid not in protected and is_automated_browser(pid, name)
+    ]
+    reaped = 0
+    for pid in orphans:
+        reaped += kill_processes(process_tree(pid, table))
+    if reaped:
+        METRICS.incr("orphan_processes_reaped", reaped)
+        METRICS.record("orphans_reaped", processes=reaped)
+        logger.warning(f"Reaped {reaped} orphaned browser processes")
+    return reaped
+
+
+def kill_driver(driver):
+    service_process = getattr(getattr(driver, "service", None), "process", None)
+    if service_process is None:
+        return 0
+    return kill_processes(process_tree(service_process.pid))
+
+
+class DriverWatchdog:
+
+    def __init__(self, check_interval=1, reap_interval=REAP_INTERVAL):
+        self.lock = threading.Lock()
+        self.check_interval = check_interval
+        self.reap_interval = reap_interval
+        self.deadlines = {}
+        self.thread = None
+
+    def start(self):
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, daemon=True)
+                self.thread.start()
+
+    @contextlib.contextmanager
+    def watch(self, driver, timeout, label=""):
+        self.start()
+        key = id(driver)
+        with self.lock:
+            self.deadlines[key] = (time.time() + timeout, driver, label)
+        try:
+            yield driver
+        finally:
+            with self.lock:
+                self.deadlines.pop(key, None)
+
+    def run(self):
+        last_reap = time.time()
+        while True:
+            time.sleep(self.check_interval)
+            now = time.time()
+            with self.lock:
+                expired = [(key, entry) for key, entry in self.deadlines.items() if entry[0] < now]
+                for key, _ in expired:
+                    del self.deadlines[key]
+            for _, (_, driver, label) in expired:
+                # Killing the processes makes the blocked Selenium call raise in its own thread
+                killed = kill_driver(driver)
+                METRICS.incr("watchdog_kills")
+                METRICS.record("watchdog_kill", label=label, processes=killed)
+                logger.error(f"Watchdog killed hung driver ({killed} processes): {label}")
+            if now - last_reap >= self.reap_interval:
+                reap_orphaned_browsers()
+                last_reap = now
+
+
+WATCHDOG = DriverWatchdog()
+
+
+def build_options(block_profile=BLOCK_PROFILE, page_load_strategy=None):
+    options = webdriver.ChromeOptions()
+    for argument in OPTIONS.arguments:
+        options.add_argument(argument)
+    options.page_load_strategy = page_load_strategy or PAGE_LOAD_STRATEGY
+    prefs = BLOCK_PROFILES[block_profile]["prefs"]
+    if prefs:
+        options.add_experimental_option("prefs", prefs)
+    if MEASURE_PAGE_BYTES:
+        options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+    return options
+
+
+def apply_block_profile(driver, block_profile):
+    # CDP network settings only reach the current target, every tab opened later needs them again
+    blocked_urls = BLOCK_PROFILES[block_profile]["blocked_urls"]
+    if blocked_urls or MEASURE_PAGE_BYTES:
+        driver.execute_cdp_cmd("Network.enable", {})
+    if blocked_urls:
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": blocked_urls})
+
+
+def create_driver(block_profile=BLOCK_PROFILE, page_load_strategy=None):
+    global starting_drivers
+    started = time.time()
+    with driver_pids_lock:
+        starting_drivers += 1
+    try:
+        driver = webdriver.Chrome(options=build_options(block_profile, page_load_strategy))
+        register_driver(driver)
+    finally:
+        with driver_pids_lock:
+            starting_drivers -= 1
+    apply_block_profile(driver, block_profile)
+    driver.set_page_load_timeout(TIMEOUTS["page_load"])
+    driver.set_script_timeout(TIMEOUTS["script"])
+    driver.block_profile = block_profile
+    METRICS.observe("driver_startup_seconds", time.time() - started)
+    METRICS.record("driver_start", seconds=time.time() - started)
+    return driver
+
+
+def page_transfer_bytes(driver):
+    # Sum of encoded bytes for every request finished since the last call
+    if not MEASURE_PAGE_BYTES:
+        return 0
+    total = 0
+    for entry in driver.get_log("performance"):
+        message = json.loads(entry["message"])["message"]
+        if message["method"] == "Network.loadingFinished":
+            total += message["params"].get("encodedDataLength", 0)
+    return total
+
+
+def record_page_fetch(driver, url, page_type, started, route="default"):
+    seconds = time.time() - started
+    transferred = page_transfer_bytes(driver)
+    profile = getattr(driver, "block_profile", BLOCK_PROFILE)
+    METRICS.incr(f"pages_{page_type}")
+    METRICS.observe(f"page_bytes_{profile}", transferred)
+    METRICS.observe("page_fetch_seconds", seconds)
+    METRICS.record("page_fetch", url=url, page_type=page_type, route=route, block_profile=profile, bytes=transferred, seconds=seconds)
+    logger.info(f"Transferred {transferred / 1024:.1f} KiB in {seconds:.2f}s ({profile} profile): {url}")
+
+
+def page_settled(page_type):
+    # The listing, a finished load, or a page that is plainly a block/error page; the last two
+    # never grow the listing, waiting them out would cost the whole READY_TIMEOUT per rejected fetch
+    def condition(driver):
+        if driver.find_elements(By.CSS_SELECTOR, READY_SELECTORS[page_type]):
+            return True
+        if driver.execute_script("return document.readyState") == "complete":
+            return True
+        source = driver.page_source.lower()
+        return any(fingerprint in source for fingerprint in BLOCK_FINGERPRINTS + ERROR_FINGERPRINTS)
+    return condition
+
+
+def wait_until_ready(driver, page_type, timeout=None):
+    try:
+        WebDriverWait(driver, timeout or READY_TIMEOUT).until(page_settled(page_type))
+        ready = True
+    except TimeoutException:
+        # Pages without any listing/review are legitimate, let the parser decide
+        ready = False
+    driver.ready_at_ms = driver.execute_script("return performance.now()")
+    return ready
+
+
+## Page classification
+MIN_PAGE_CHARS = 5000
+
+BLOCK_FINGERPRINTS = [
+    "captcha", "px-captcha", "cf-challenge", "challenge-platform", "/cdn-cgi/challenge",
+    "access denied", "attention required", "verify you are a human", "unusual traffic",
+    "request blocked", "are you a robot"
+]
+ERROR_FINGERPRINTS = [
+    "err_", "this site can’t be reached", "502 bad gateway", "503 service", "504 gateway",
+    "internal server error", "proxy error"
+]
+NO_RESULTS_FINGERPRINTS = {
+    "search": ["no results", "0 results", "did not match any"],
+    "product": ["no reviews yet", "be the first to review"]
+}
+
+
+class PageRejected(Exception):
+
+    def __init__(self, label, url):
+        super().__init__(f"Page classified as {label}: {url}")
+        self.label = label
+
+
+def classify_page(driver, page_type):
+    # Checked before extraction so a block page never counts as an empty result
+    if driver.find_elements(By.CSS_SELECTOR, READY_SELECTORS[page_type]):
+        return "ok"
+    source = driver.page_source.lower()
+    if any(fingerprint in source for fingerprint in BLOCK_FINGERPRINTS):
+        return "blocked"
+    if any(fingerprint in source for fingerprint in ERROR_FINGERPRINTS):
+        return "error"
+    if len(source) < MIN_PAGE_CHARS:
+        return "empty"
+    if any(fingerprint in source for fingerprint in NO_RESULTS_FINGERPRINTS[page_type]):
+        return "ok"
+    return "empty"
+
+
+def route_for_attempt(tries):
+    return PROXY_ROUTES[tries % len(PROXY_ROUTES)]
+
+
+def record_classification(url, route, label):
+    METRICS.incr(f"route_{route['name']}_fetches")
+    METRICS.incr(f"route_{route['name']}_{label}")
+    if label != "ok":
+        METRICS.record("page_rejected", url=url, route=route["name"], label=label)
+
+
+def route_block_rates():
+    counters = METRICS.summary()["counters"]
+    rates = {}
+    for route in PROXY_ROUTES:
+        fetches = counters.get(f"route_{route['name']}_fetches", 0)
+        if fetches:
+            rates[route["name"]] = round(counters.get(f"route_{route['name']}_blocked", 0) / fetches, 3)
+    return rates
+
+
+def load_page(driver, url, page_type, location="us", route=None):
+    route = route or PROXY_ROUTES[0]
+    started = time.time()
+    driver.get(get_scrapeops_url(url, location=location, route=route))
+    if PAGE_LOAD_STRATEGY != "normal":
+        ready = wait_until_ready(driver, page_type)
+        if not ready:
+            logger.warning(f"Page not settled within {READY_TIMEOUT}s: {url}")
+    logger.info(f"Fetched {url}")
+    record_page_fetch(driver, url, page_type, started, route=route["name"])
+
+    label = classify_page(driver, page_type)
+    record_classification(url, route, label)
+    if label != "ok":
+        raise PageRejected(label, url)
+
+
+def record_load_savings(driver):
+    # How long the full load event took past the point where we started parsing
+    ready_at_ms = getattr(driver, "ready_at_ms", None)
+    if ready_at_ms is None:
+        return
+    timing = driver.execute_script(
+        "const nav = performance.getEntriesByType('navigation')[0];"
+        "return [nav ? nav.loadEventEnd : 0, performance.now()];"
+    )
+    load_event_end, now = timing
+    # If load still hasn't fired, what we saved is at least the time elapsed since ready
+    saved_ms = (load_event_end if load_event_end > 0 else now) - ready_at_ms
+    METRICS.observe("load_seconds_saved", max(saved_ms, 0) / 1000)
+    driver.ready_at_ms = None
+
+
+def close_driver(driver):
+    try:
+        record_load_savings(driver)
+    except Exception as e:
+        logger.debug(f"Could not read load timing: {e}")
+    driver.quit()
+
+
+def process_rss_mb(pid):
+    try:
+        with open(f"/proc/{pid}/status", "r") as status_file:
+            for line in status_file:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return 0.0
+
+
+def driver_rss_mb(driver):
+    # chromedriver plus every browser, renderer and GPU process below it
+    service_process = getattr(getattr(driver, "service", None), "process", None)
+    if service_process is None:
+        return 0.0
+    return sum(process_rss_mb(pid) for pid in process_tree(service_process.pid))
+
+
+class DriverPool:
+
+    def __init__(self, max_pages=DRIVER_MAX_PAGES, max_rss_mb=DRIVER_MAX_RSS_MB, driver_factory=None):
+        self.lock = threading.Lock()
+        # Swappable so the same scraping code can run against a replay driver
+        self.driver_factory = driver_factory or create_driver
+        self.max_pages = max_pages
+        self.max_rss_mb = max_rss_mb
+        self.idle = deque()
+        self.pages = {}
+        # samples, peak and total RSS per worker thread
+        self.memory = defaultdict(lambda: [0, 0.0, 0.0])
+
+    def acquire(self):
+        with self.lock:
+            if self.idle:
+                return self.idle.popleft()
+        driver = self.driver_factory()
+        with self.lock:
+            self.pages[id(driver)] = 0
+        return driver
+
+    def retire(self, driver, reason):
+        with self.lock:
+            self.pages.pop(id(driver), None)
+        METRICS.incr(f"drivers_retired_{reason}")
+        close_driver(driver)
+
+    def release(self, driver, healthy=True):
+        if not healthy:
+            self.retire(driver, "failure")
+            return
+
+        try:
+            record_load_savings(driver)
+        except Exception as e:
+            logger.debug(f"Could not read load timing: {e}")
+
+        rss_mb = driver_rss_mb(driver)
+        worker = threading.current_thread().name
+        with self.lock:
+            self.pages[id(driver)] = self.pages.get(id(driver), 0) + 1
+            pages = self.pages[id(driver)]
+            memory = self.memory[worker]
+            memory[0] += 1
+            memory[1] = max(memory[1], rss_mb)
+            memory[2] += rss_mb
+
+        if pages >= self.max_pages:
+            logger.info(f"Recycling driver after {pages} pages")
+            self.retire(driver, "pages")
+        elif rss_mb >= self.max_rss_mb:
+            logger.info(f"Recycling driver at {rss_mb:.0f} MB RSS after {pages} pages")
+            self.retire(driver, "memory")
+        else:
+            with self.lock:
+                self.idle.append(driver)
+
+    def close(self):
+        with self.lock:
+            drivers = list(self.idle)
+            self.idle.clear()
+        for driver in drivers:
+            driver.quit()
+
+    def memory_summary(self):
+        with self.lock:
+            return {
+                worker: {
+                    "samples": samples,
+                    "peak_rss_mb": round(peak, 1),
+                    "avg_rss_mb": round(total / samples, 1)
+                }
+                for worker, (samples, peak, total) in self.memory.items() if samples
+            }
+
+    def log_memory_summary(self):
+        for worker, summary in self.memory_summary().items():
+            METRICS.record("worker_memory", worker=worker, **summary)
+            logger.info(f"{worker} memory: {summary}")
+
+
+DRIVER_POOL = DriverPool()
+
+
+def compare_block_profiles(url, location="us", profiles=("none", BLOCK_PROFILE)):
+    results = {}
+    for profile in profiles:
+        # An eager driver returns at DOMContentLoaded and misses the late requests, mostly the ones the block list removes
+        driver = create_driver(block_profile=profile, page_load_strategy="normal")
+        try:
+            started = time.time()
+            driver.get(get_scrapeops_url(url, location=location))
+            seconds = time.time() - started
+            results[profile] = {"bytes": page_transfer_bytes(driver), "seconds": seconds}
+        finally:
+            driver.quit()
+        logger.info(f"{profile}: {results[profile]['bytes'] / 1024:.1f} KiB, {results[profile]['seconds']:.2f}s")
+    return results
+
+
+
+class Record:
+    __slots__ = ()
+    FIELD_NAMES = ()
+    TEXT_FIELDS = ()
+    # Text fields left as they are, e.g. values filled in later
+    RAW_FIELDS = ()
 
     def __post_init__(self):
         self.check_string_fields()
         
     def check_string_fields(self):
-        for field in fields(self):
-            # Check string fields
-            if isinstance(getattr(self, field.name), str):
-                # If empty set default text
-                if getattr(self, field.name) == "":
-                    setattr(self, field.name, f"No {field.name}")
-                    continue
-                # Strip any trailing spaces, etc.
-                value = getattr(self, field.name)
-                setattr(self, field.name, value.strip())
+        # Field names are worked out once per class, see record()
+        for name in self.TEXT_FIELDS:
+            value = getattr(self, name)
+            if value.__class__ is str:
+                # Empty gets default text, anything else loses trailing spaces, etc.
+                setattr(self, name, value.strip() if value else f"No {name}")
+
+    def to_dict(self):
+        return dict(zip(self.FIELD_NAMES, self.to_row()))
+
+    def to_row(self):
+        return self.row_getter(self)
+
+    @classmethod
+    def from_row(cls, row):
+        # Rows only ever come from records that were already normalized
+        record = object.__new__(cls)
+        for name, value in zip(cls.FIELD_NAMES, row):
+            object.__setattr__(record, name, value)
+        return record
+
 
-@dataclass
-class ReviewData:
+def record(cls):
+    cls = dataclass(slots=True)(cls)
+    cls.FIELD_NAMES = tuple(field.name for field in fields(cls))
+    # Numeric fields are included, scraped ratings often arrive as text
+    cls.TEXT_FIELDS = tuple(
+        field.name for field in fields(cls) if field.type not in (bool, "bool") and field.name not in cls.RAW_FIELDS
+    )
+    getter = operator.attrgetter(*cls.FIELD_NAMES)
+    cls.row_getter = staticmethod(getter)
+    return cls
+
+
+def review_tokens(text):
+    return re.findall(r"\w+", text.lower())
+
+
+ANONYMOUS_NAME = re.compile(r"anonymous-\d+")
+
+
+def review_content_hash(text, name="", date=""):
+    # Case and whitespace don't make a review different, a different reviewer or date does
+    normalized = " ".join(review_tokens(text))
+    if name or date:
+        normalized = "\x1f".join((name.strip().lower(), date.strip(), normalized))
+    return hashlib.blake2b(normalized.encode("utf-8"), digest_size=8).hexdigest()
+
+
+@record
+class SearchData(Record):
+    name: str = ""
+    stars: float = 0
+    g2_url: str = ""
+    description: str = ""
+
+
+@record
+class ReviewData(Record):
     name: str = ""
     date: str = ""
     job_title: str = ""
@@ -67,55 +727,223 @@ class ReviewData:
     review_source: str = ""
     validated: bool = False
     incentivized: bool = False
+    content_hash: str = ""
+    near_duplicate: bool = False
+    RAW_FIELDS = ("content_hash",)
+
+    def identity_hash(self):
+        # Worked out on first use so building records stays cheap
+        if not self.content_hash:
+            # anonymous-N is only the card's position on the page, it shifts when a review is added
+            name = "" if ANONYMOUS_NAME.fullmatch(self.name) else self.name
+            self.content_hash = review_content_hash(self.full_review, name, self.date)
+        return self.content_hash
+
+
+class RecordBatch:
+
+    def __init__(self, record_type):
+        # One tuple per record instead of one object, for large in-memory buffers
+        self.record_type = record_type
+        self.rows = []
+
+    def append(self, item):
+        self.rows.append(item.to_row())
+
+    def extend(self, items):
+        self.rows.extend(item.to_row() for item in items)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __iter__(self):
+        return (self.record_type.from_row(row) for row in self.rows)
+
+    def column(self, name):
+        index = self.record_type.FIELD_NAMES.index(name)
+        return [row[index] for row in self.rows]
+
+    def to_dicts(self):
+        return [dict(zip(self.record_type.FIELD_NAMES, row)) for row in self.rows]
+
+    def write_csv(self, output_file, header=True):
+        writer = csv.writer(output_file)
+        if header:
+            writer.writerow(self.record_type.FIELD_NAMES)
+        writer.writerows(self.rows)
+
+
+## Review identity
+MINHASH_PERMUTATIONS = 64
+LSH_BANDS = 16
+NEAR_DUPLICATE_THRESHOLD = 0.7
+SHINGLE_SIZE = 2
+# About 1.7 KB per remembered review (packed signature plus one bucket slot per band), ~340 MB at the cap
+IDENTITY_MAX_ENTRIES = 200_000
+
+
+class ReviewIdentity:
+
+    def __init__(self, permutations=MINHASH_PERMUTATIONS, bands=LSH_BANDS, threshold=NEAR_DUPLICATE_THRESHOLD, max_entries=IDENTITY_MAX_ENTRIES):
+        self.lock = threading.Lock()
+        self.permutations = permutations
+        self.bands = bands
+        self.rows = permutations // bands
+        self.threshold = threshold
+        self.max_entries = max_entries
+        # (product, content hash) -> packed signature, oldest first so memory stays bounded
+        self.entries = OrderedDict()
+        # band key -> entry, or a list of them once several reviews share the bucket
+        self.buckets = [{} for _ in range(bands)]
+
+    def signature(self, text):
+        # One-permutation MinHash: a single hash per shingle, binned, instead of one hash per permutation
+        tokens = review_tokens(text)
+        if len(tokens) < SHINGLE_SIZE:
+            return None
+        empty = 1 << 64
+        bins = [empty] * self.permutations
+        for index in range(len(tokens) - SHINGLE_SIZE + 1):
+            shingle = " ".join(tokens[index:index + SHINGLE_SIZE])
+            # Signatures never leave this process, so the builtin (salted) hash is fine
+            value = hash(shingle) & 0xFFFFFFFFFFFFFFFF
+            slot = value % self.permutations
+            value //= self.permutations
+            if value < bins[slot]:
+                bins[slot] = value
+        # Fill empty bins from the next filled one so short reviews still compare fairly
+        filled = [slot for slot, value in enumerate(bins) if value != empty]
+        for slot, value in enumerate(bins):
+            if value == empty:
+                position = bisect.bisect_right(filled, slot)
+                donor = filled[position] if position < len(filled) else filled[0]
+                bins[slot] = bins[donor] ^ (slot * 0x9E3779B97F4A7C15 & 0xFFFFFFFFFFFF)
+        return bins
+
+    def band_keys(self, signature):
+        return [hash(tuple(signature[band * self.rows:(band + 1) * self.rows])) for band in range(self.bands)]
+
+    def similarity(self, signature, packed):
+        other = array("Q", packed)
+        return sum(1 for left, right in zip(signature, other) if left == right) / self.permutations
+
+    def check(self, review, scope=""):
+        # True for an exact copy on the same product, same reviewer, date and text (drop it)
+        # The same text anywhere else, e.g. syndicated to another product, is only flagged as a near copy
+        entry = (scope, review.identity_hash())
+        signature = self.signature(review.full_review)
+        with self.lock:
+            if entry in self.entries:
+                self.entries.move_to_end(entry)
+                return True
+            if signature is None:
+                self.remember(entry, None)
+                return False
+            keys = self.band_keys(signature)
+            candidates = set()
+            for band, key in enumerate(keys):
+                bucket = self.buckets[band].get(key)
+                if isinstance(bucket, list):
+                    candidates.update(bucket)
+                elif bucket is not None:
+                    candidates.add(bucket)
+            for candidate in candidates:
+                if self.similarity(signature, self.entries[candidate]) >= self.threshold:
+                    review.near_duplicate = True
+                    break
+            self.remember(entry, signature, keys)
+            return False
+
+    def remember(self, entry, signature, keys=()):
+        # Band keys are not kept per entry, drop() recomputes them from the packed signature
+        self.entries[entry] = array("Q", signature).tobytes() if signature else b""
+        for band, key in enumerate(keys):
+            # Most buckets only ever hold one review, a bare entry is far smaller than a list
+            bucket = self.buckets[band].setdefault(key, entry)
+            if isinstance(bucket, list):
+                bucket.append(entry)
+            elif bucket != entry:
+                self.buckets[band][key] = [bucket, entry]
+        while len(self.entries) > self.max_entries:
+            self.drop(next(iter(self.entries)))
+
+    def drop(self, entry):
+        packed = self.entries.pop(entry)
+        if not packed:
+            return
+        for band, key in enumerate(self.band_keys(array("Q", packed))):
+            bucket = self.buckets[band].get(key)
+            if bucket == entry:
+                del self.buckets[band][key]
+            elif isinstance(bucket, list) and entry in bucket:
+                bucket.remove(entry)
+                if len(bucket) == 1:
+                    self.buckets[band][key] = bucket[0]
 
+    def forget(self, content_hashes, scope=""):
+        with self.lock:
+            for content_hash in content_hashes:
+                if (scope, content_hash) in self.entries:
+                    self.drop((scope, content_hash))
 
-    def __post_init__(self):
-        self.check_string_fields()
-        
-    def check_string_fields(self):
-        for field in fields(self):
-            # Check string fields
-            if isinstance(getattr(self, field.name), str):
-                # If empty set default text
-                if getattr(self, field.name) == "":
-                    setattr(self, field.name, f"No {field.name}")
-                    continue
-                # Strip any trailing spaces, etc.
-                value = getattr(self, field.name)
-                setattr(self, field.name, value.strip())
+
+REVIEW_IDENTITY = ReviewIdentity()
 
 
 class DataPipeline:
     
-    def __init__(self, csv_filename="", storage_queue_limit=50):
+    def __init__(self, csv_filename="", storage_queue_limit=50, review_identity=None, review_scope="", on_flush=None):
         self.names_seen = []
         self.storage_queue = []
         self.storage_queue_limit = storage_queue_limit
         self.csv_filename = csv_filename
         self.csv_file_open = False
+        self.review_identity = review_identity
+        # Exact review duplicates are only looked for within this scope (the product)
+        self.review_scope = review_scope
+        self.hashes_accepted = []
+        self.on_flush = on_flush
     
     def save_to_csv(self):
-        self.csv_file_open = True
         data_to_save = []
         data_to_save.extend(self.storage_queue)
         self.storage_queue.clear()
         if not data_to_save:
             return
+        # No filename means no CSV, the items only go to on_flush
+        if not self.csv_filename:
+            self.flushed(data_to_save)
+            return
+        self.csv_file_open = True
 
-        keys = [field.name for field in fields(data_to_save[0])]
+        keys = data_to_save[0].FIELD_NAMES
         file_exists = os.path.isfile(self.csv_filename) and os.path.getsize(self.csv_filename) > 0
         with open(self.csv_filename, mode="a", newline="", encoding="utf-8") as output_file:
-            writer = csv.DictWriter(output_file, fieldnames=keys)
+            writer = csv.writer(output_file)
 
             if not file_exists:
-                writer.writeheader()
+                writer.writerow(keys)
 
-            for item in data_to_save:
-                writer.writerow(asdict(item))
+            writer.writerows(item.to_row() for item in data_to_save)
 
         self.csv_file_open = False
+        self.flushed(data_to_save)
+
+    def flushed(self, items):
+        if self.on_flush:
+            self.on_flush(items)
                     
     def is_duplicate(self, input_data):
+        if self.review_identity is not None and isinstance(input_data, ReviewData):
+            # Reviews are identified by their text, different people can share a display name
+            if self.review_identity.check(input_data, self.review_scope):
+                METRICS.incr("reviews_exact_duplicates")
+                logger.warning(f"Duplicate review found from {input_data.name}. Item dropped.")
+                return True
+            if input_data.near_duplicate:
+                METRICS.incr("reviews_near_duplicates")
+            self.hashes_accepted.append(input_data.identity_hash())
+            return False
         if input_data.name in self.names_seen:
             logger.warning(f"Duplicate item found: {input_data.name}. Item dropped.")
             return True
@@ -127,6 +955,8 @@ class DataPipeline:
             self.storage_queue.append(scraped_data)
             if len(self.storage_queue) >= self.storage_queue_limit and self.csv_file_open == False:
                 self.save_to_csv()
+            return True
+        return False
                        
     def close_pipeline(self):
         if self.csv_file_open:
@@ -135,203 +965,1048 @@ class DataPipeline:
             self.save_to_csv()
 
 
+## Transactional writes
+FSYNC_EVERY = 1  # commits between fsyncs, 0 leaves flushing to the OS
+commit_lock = threading.Lock()
+commit_count = 0
+file_locks = defaultdict(threading.Lock)
+
+
+def should_fsync():
+    global commit_count
+    if not FSYNC_EVERY:
+        return False
+    with commit_lock:
+        commit_count += 1
+        return commit_count % FSYNC_EVERY == 0
+
+
+class TransactionalPipeline(DataPipeline):
+
+    def __init__(self, csv_filename="", storage_queue_limit=50, review_identity=None, review_scope="", on_flush=None):
+        # Rows are staged next to the target and only appended to it on commit
+        super().__init__(
+            csv_filename=f"{csv_filename}.{uuid.uuid4().hex}.part",
+            storage_queue_limit=storage_queue_limit,
+            review_identity=review_identity,
+            review_scope=review_scope,
+            on_flush=on_flush
+        )
+        self.committed_filename = csv_filename
+        self.staged = []
+
+    def flushed(self, items):
+        # Downstream consumers only hear about rows once they are committed
+        self.staged.extend(items)
+
+    def commit(self):
+        self.save_to_csv()
+        staging = self.csv_filename
+        if not os.path.isfile(staging):
+            return
+        target = self.committed_filename
+        sync = should_fsync()
+        with file_locks[target]:
+            temp_filename = f"{target}.{uuid.uuid4().hex}.tmp"
+            with open(temp_filename, "wb") as temp_file:
+                with open(staging, "rb") as staging_file:
+                    if os.path.isfile(target) and os.path.getsize(target) > 0:
+                        with open(target, "rb") as target_file:
+                            shutil.copyfileobj(target_file, temp_file)
+                        # The target already has a header
+                        staging_file.readline()
+                    shutil.copyfileobj(staging_file, temp_file)
+                if sync:
+                    temp_file.flush()
+                    os.fsync(temp_file.fileno())
+            os.replace(temp_filename, target)
+            if sync and hasattr(os, "O_DIRECTORY"):
+                directory = os.open(os.path.dirname(os.path.abspath(target)), os.O_DIRECTORY)
+                try:
+                    os.fsync(directory)
+                finally:
+                    os.close(directory)
+        os.remove(staging)
+        staged, self.staged = self.staged, []
+        if self.on_flush:
+            self.on_flush(staged)
+
+    def rollback(self):
+        self.storage_queue.clear()
+        self.staged.clear()
+        if os.path.isfile(self.csv_filename):
+            os.remove(self.csv_filename)
+        # A retry of the same page must not see its own reviews as duplicates
+        if self.review_identity is not None:
+            self.review_identity.forget(self.hashes_accepted, self.review_scope)
+            self.hashes_accepted.clear()
+
+    def close_pipeline(self):
+        super().close_pipeline()
+        self.commit()
+
+
+class CollectorPipeline(DataPipeline):
+
+    def __init__(self, storage_queue_limit=50, review_identity=None):
+        # Reviews are deduped by identity, never by reviewer name; a private one per attempt
+        # so a retry doesn't see its own reviews, the receiving side checks the shared identity
+        super().__init__(storage_queue_limit=storage_queue_limit, review_identity=review_identity or ReviewIdentity())
+        self.items = []
+
+    def save_to_csv(self):
+        # Keep flushed items in memory so a remote worker can ship them back
+        self.items.extend(self.storage_queue)
+        self.storage_queue.clear()
+
+    def rollback(self):
+        self.storage_queue.clear()
+        self.items.clear()
+
+
+class StreamingPipeline(DataPipeline):
+
+    def __init__(self, csv_filename="", storage_queue_limit=50, on_accept=None, on_flush=None):
+        super().__init__(csv_filename=csv_filename, storage_queue_limit=storage_queue_limit, on_flush=on_flush)
+        self.on_accept = on_accept
+        self.lock = threading.Lock()
+
+    def add_data(self, scraped_data):
+        # Search pages run in parallel, so dedup and hand-off must be atomic
+        with self.lock:
+            if self.is_duplicate(scraped_data):
+                return False
+            self.storage_queue.append(scraped_data)
+            if len(self.storage_queue) >= self.storage_queue_limit:
+                self.save_to_csv()
+        if self.on_accept:
+            self.on_accept(scraped_data)
+        return True
+
+    def close_pipeline(self):
+        with self.lock:
+            super().close_pipeline()
+
+
+class ProductRegistry:
 
-def scrape_search_results(keyword, location, page_number, data_pipeline=None, retries=3):
+    def __init__(self, csv_filename="product-keywords.csv"):
+        self.lock = threading.Lock()
+        self.csv_filename = csv_filename
+        self.products = {}
+
+    def register(self, g2_url, keyword, name=""):
+        # True only the first time a product is seen in this run
+        product_id = store.normalize_product_url(g2_url)
+        with self.lock:
+            product = self.products.get(product_id)
+            if product is None:
+                self.products[product_id] = {"name": name, "g2_url": g2_url, "keywords": [keyword]}
+                return True
+            if keyword not in product["keywords"]:
+                product["keywords"].append(keyword)
+            return False
+
+    def keywords_for(self, g2_url):
+        with self.lock:
+            product = self.products.get(store.normalize_product_url(g2_url))
+            return list(product["keywords"]) if product else []
+
+    def save(self):
+        with self.lock:
+            rows = [
+                {"product_id": product_id, "name": product["name"], "g2_url": product["g2_url"], "keywords": "|".join(product["keywords"])}
+                for product_id, product in self.products.items()
+            ]
+        with open(self.csv_filename, mode="w", newline="", encoding="utf-8") as output_file:
+            writer = csv.DictWriter(output_file, fieldnames=["product_id", "name", "g2_url", "keywords"])
+            writer.writeheader()
+            writer.writerows(rows)
+        shared = sum(1 for row in rows if "|" in row["keywords"])
+        logger.info(f"{len(rows)} unique products, {shared} shared between keywords")
+
+
+
+def search_url(keyword, page_number):
     formatted_keyword = keyword.replace(" ", "+")
-    url = f"https://www.g2.com/search?page={page_number+1}&query={formatted_keyword}"
-    tries = 0
-    success = False
-    
-    while tries <= retries and not success:
-        driver = webdriver.Chrome(options=OPTIONS)
-        try:
-            scrapeops_proxy_url = get_scrapeops_url(url, location=location)
-            driver.get(scrapeops_proxy_url)
-            logger.info(f"Fetched {url}")
-                
-            ## Extract Data
+    return f"https://www.g2.com/search?page={page_number+1}&query={formatted_keyword}"
 
-            
-            div_cards = driver.find_elements(By.CSS_SELECTOR, "div[class='product-listing mb-1 border-bottom']")
 
+RESULTS_PER_PAGE = 20
 
-            for div_card in div_cards:
 
-                name = div_card.find_element(By.CSS_SELECTOR, "div[class='product-listing__product-name']")
+def detect_page_count(driver):
+    # Prefer the pagination links, fall back to the "N results" counter
+    page_numbers = []
+    for link in driver.find_elements(By.CSS_SELECTOR, "a[href*='page=']"):
+        href_match = re.search(r"[?&]page=(\d+)", link.get_attribute("href") or "")
+        if href_match:
+            page_numbers.append(int(href_match.group(1)))
+    if page_numbers:
+        return max(page_numbers)
 
-                g2_url = name.find_element(By.CSS_SELECTOR, "a").get_attribute("href")
+    body_text = driver.find_element(By.CSS_SELECTOR, "body").text
+    count_match = re.search(r"([\d,]+)\s+(?:results|products|listings)", body_text, re.IGNORECASE)
+    if count_match:
+        return max(1, math.ceil(int(count_match.group(1).replace(",", "")) / RESULTS_PER_PAGE))
+    return None
 
-                rating_elements = div_card.find_elements(By.CSS_SELECTOR, "span[class='fw-semibold']")
-                has_rating = len(rating_elements) > 0 
-                rating = 0.0
 
-                if has_rating:
-                    rating = rating_elements[0].text
+def parse_search_page(driver, data_pipeline):
+    div_cards = driver.find_elements(By.CSS_SELECTOR, "div[class='product-listing mb-1 border-bottom']")
+    new_items = 0
 
-                description = div_card.find_element(By.CSS_SELECTOR, "p").text
-                
-                search_data = SearchData(
-                    name=name.text,
-                    stars=rating,
-                    g2_url=g2_url,
-                    description=description
-                )
-                
 
-                data_pipeline.add_data(search_data)
+    for div_card in div_cards:
+
+        name = div_card.find_element(By.CSS_SELECTOR, "div[class='product-listing__product-name']")
+
+        g2_url = name.find_element(By.CSS_SELECTOR, "a").get_attribute("href")
+
+        rating_elements = div_card.find_elements(By.CSS_SELECTOR, "span[class='fw-semibold']")
+        has_rating = len(rating_elements) > 0 
+        rating = 0.0
+
+        if has_rating:
+            rating = rating_elements[0].text
+
+        description = div_card.find_element(By.CSS_SELECTOR, "p").text
+        
+        search_data = SearchData(
+            name=name.text,
+            stars=rating,
+            g2_url=g2_url,
+            description=description
+        )
+        
+
+        if data_pipeline.add_data(search_data):
+            new_items += 1
+
+    return len(div_cards), new_items
+
+
+def scrape_search_results(keyword, location, page_number, data_pipeline=None, retries=3, detect_pages=False):
+    url = search_url(keyword, page_number)
+    tries = 0
+    success = False
+    result = {"cards": 0, "new": 0, "page_count": None, "exhausted": False}
+    
+    while tries <= retries and not success:
+        driver = DRIVER_POOL.acquire()
+        driver_ok = False
+        try:
+            with WATCHDOG.watch(driver, TIMEOUTS["job"], url):
+                load_page(driver, url, "search", location=location, route=route_for_attempt(tries))
+                    
+                ## Extract Data
+                result["cards"], result["new"] = parse_search_page(driver, data_pipeline)
+                if detect_pages:
+                    result["page_count"] = detect_page_count(driver)
+            # After a partial failed attempt our own earlier rows show up as duplicates
+            result["exhausted"] = result["cards"] == 0 or (result["new"] == 0 and tries == 0)
+            METRICS.record("search_page", keyword=keyword, page_number=page_number, cards=result["cards"], page_count=result["page_count"])
             logger.info(f"Successfully parsed data from: {url}")
             success = True
         
                     
+        except PageRejected as e:
+            # The browser is fine, only the route was refused; retry right away on the next one
+            driver_ok = True
+            logger.warning(f"{e}, retrying via {route_for_attempt(tries + 1)['name']} route, retries left {retries-tries}")
+            tries += 1
+
         except Exception as e:
+            METRICS.record("page_error", url=url, page_type="search")
             logger.error(f"An error occurred while processing page {url}: {e}")
             logger.info(f"Retrying request for page: {url}, retries left {retries-tries}")
+            tries += 1
 
         finally:
-            driver.quit()
+            DRIVER_POOL.release(driver, healthy=success or driver_ok)
 
     if not success:
         raise Exception(f"Max Retries exceeded: {retries}")
+    return result
 
 
+def pages_to_fetch(first_page, max_pages):
+    if first_page["exhausted"]:
+        return 1
+    if first_page["page_count"] is None:
+        return max_pages
+    return min(first_page["page_count"], max_pages)
 
 
-def start_scrape(keyword, pages, location, data_pipeline=None, max_threads=5, retries=3):
-    with concurrent.futures.ThreadPoolExecutor(max_workers=max_threads) as executor:
-        executor.map(
-            scrape_search_results,
-            [keyword] * pages,
-            [location] * pages,
-            range(pages),
-            [data_pipeline] * pages,
-            [retries] * pages
-        )
 
 
-def process_business(row, location, retries=3):
+def start_scrape(keyword, pages, location, data_pipeline=None, max_threads=5, retries=3):
+    # pages is an upper bound, the real page count is read from page 1
+    first_page = scrape_search_results(keyword, location, 0, data_pipeline, retries, detect_pages=True)
+    page_count = pages_to_fetch(first_page, pages)
+    logger.info(f"{keyword}: fetching {page_count} pages (listing reports {first_page['page_count']})")
+    stop = threading.Event()
+
+    def scrape_page(page_number):
+        if stop.is_set():
+            return
+        result = scrape_search_results(keyword, location, page_number, data_pipeline, retries)
+        if result["exhausted"]:
+            logger.info(f"{keyword}: page {page_number+1} had no new products, stopping")
+            stop.set()
+
+    failed = 0
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_threads) as executor:
+        futures = {executor.submit(scrape_page, page_number): page_number for page_number in range(1, page_count)}
+        for future in concurrent.futures.as_completed(futures):
+            try:
+                future.result()
+            except Exception as e:
+                failed += 1
+                logger.error(f"{keyword}: search page {futures[future]+1} failed: {e}")
+    if failed:
+        logger.warning(f"{keyword}: {failed} of {page_count - 1} follow-up search pages failed")
+    return failed
+
+
+def review_csv_filename(row):
+    return f"{row['name'].replace(' ', '-')}.csv"
+
+
+def product_review_pipeline(row, on_flush=None):
+    return TransactionalPipeline(
+        csv_filename=review_csv_filename(row),
+        review_identity=REVIEW_IDENTITY,
+        review_scope=store.normalize_product_url(row["g2_url"]),
+        on_flush=on_flush or store.review_indexer(row)
+    )
+
+
+CARD_ERROR_LOG = "card-errors.jsonl"
+CARD_FAILURE_THRESHOLD = 0.3
+card_error_lock = threading.Lock()
+
+
+def log_card_error(url, index, review_card, error):
+    try:
+        snippet = review_card.get_attribute("outerHTML")[:2000]
+    except Exception:
+        snippet = ""
+    line = json.dumps({"url": url, "card": index, "error": str(error), "html": snippet, "ts": time.time()})
+    with card_error_lock:
+        with open(CARD_ERROR_LOG, mode="a", encoding="utf-8") as error_file:
+            error_file.write(line + "\n")
+
+
+def parse_review_card(review_card, anon_count):
+    review_date = review_card.find_elements(By.CSS_SELECTOR, "time")
+    has_text = len(review_card.find_elements(By.CSS_SELECTOR, "div[itemprop='reviewBody']")) > 0
+    if not (len(review_date) > 0 and has_text):
+        return None, anon_count
+
+    date = review_date[0].get_attribute("datetime")
+    name_array = review_card.find_elements(By.CSS_SELECTOR, "a[class='link--header-color']")
+    name = name_array[0].text if len(name_array) > 0 else "anonymous"
+    if name == "anonymous":
+        name = f"{name}-{anon_count}"
+        anon_count += 1
+
+
+    job_title_array = review_card.find_elements(By.CSS_SELECTOR, "div[class='mt-4th']")
+    job_title = job_title_array[0].text if len(job_title_array) > 0 else "n/a"
+
+    rating_container = review_card.find_element(By.CSS_SELECTOR, "div[class='f-1 d-f ai-c mb-half-small-only']")
+    rating_div = rating_container.find_element(By.CSS_SELECTOR, "div")
+
+    rating_class = rating_div.get_attribute("class")
+
+    # Last class is e.g. "stars-10", the whole token and not just its last character
+    stars_string = rating_class.split()[-1]
+    stars_large_number = float(stars_string.split("-")[-1])
+    stars_clean_number = stars_large_number/2
+
+    review_body = review_card.find_element(By.CSS_SELECTOR, "div[itemprop='reviewBody']").text
+
+    info_container = review_card.find_element(By.CSS_SELECTOR, "div[class='tags--teal']")
+    incentives_dirty = info_container.find_elements(By.CSS_SELECTOR, "div")
+    incentives_clean = []
+    source = ""
+    for incentive in incentives_dirty:
+        if incentive.text not in incentives_clean:
+            if "Review source:" in incentive.text:
+                source = incentive.text.split(": ")[-1]
+            else:
+                incentives_clean.append(incentive.text)
+    validated = "Validated Reviewer" in incentives_clean
+    incentivized = "Incentivized Review" in incentives_clean
+
+
+    review_data = ReviewData(
+        name=name,
+        date=date,
+        job_title=job_title,
+        rating=stars_clean_number,
+        full_review=review_body,
+        review_source=source,
+        validated=validated,
+        incentivized=incentivized
+    )
+    return review_data, anon_count
+
+
+REVIEW_CARD_SELECTOR = "div[class='paper paper--white paper--box mb-2 position-relative border-bottom']"
+
+
+def parse_review_page(driver, review_pipeline, url=""):
+    review_cards = driver.find_elements(By.CSS_SELECTOR, REVIEW_CARD_SELECTOR)
+
+    anon_count = 0
+    parsed = []
+    failed = 0
+    for index, review_card in enumerate(review_cards):
+        try:
+            review_data, anon_count = parse_review_card(review_card, anon_count)
+        except Exception as e:
+            # One odd card shouldn't cost the whole page
+            failed += 1
+            log_card_error(url, index, review_card, e)
+            continue
+        if review_data is not None:
+            parsed.append(review_data)
+
+    METRICS.incr("review_cards_parsed", len(parsed))
+    METRICS.incr("review_cards_failed", failed)
+    attempted = len(parsed) + failed
+    if attempted and failed / attempted > CARD_FAILURE_THRESHOLD:
+        raise Exception(f"{failed}/{attempted} review cards failed to parse")
+    if failed:
+        logger.warning(f"Kept {len(parsed)} reviews, skipped {failed} broken cards on {url} (see {CARD_ERROR_LOG})")
+
+    # Only handed to the pipeline once the page as a whole is accepted
+    for review_data in parsed:
+        review_pipeline.add_data(review_data)
+
+
+## Change detection
+def page_fingerprint(driver, row):
+    # Everything here is read off the first review page, which is already loaded
+    review_count = ""
+    count_elements = driver.find_elements(By.CSS_SELECTOR, "[itemprop='reviewCount']")
+    if count_elements:
+        review_count = count_elements[0].get_attribute("content") or count_elements[0].text.strip()
+    dates = [
+        element.get_attribute("datetime") or ""
+        for element in driver.find_elements(By.CSS_SELECTOR, f"{REVIEW_CARD_SELECTOR} time")
+    ]
+    page_hash = hashlib.blake2b(digest_size=8)
+    for element in driver.find_elements(By.CSS_SELECTOR, READY_SELECTORS["product"]):
+        page_hash.update(review_content_hash(element.text).encode("ascii"))
+    return {
+        "stars": str(row.get("stars", "")),
+        "review_count": review_count,
+        "newest_date": max(dates, default=""),
+        "page_hash": page_hash.hexdigest(),
+        "checked": time.time()
+    }
+
+
+def fingerprint_matches(previous, current):
+    # A one-decimal average rarely moves when a review lands, so stars alone never decide this
+    return all(previous[name] == current[name] for name in ("stars", "review_count", "newest_date", "page_hash"))
+
+
+def log_fingerprint_savings():
+    counters = METRICS.summary()["counters"]
+    unchanged = counters.get("fingerprint_unchanged", 0)
+    changed = counters.get("fingerprint_changed", 0)
+    logger.info(f"Change detection: {unchanged} products fetched but unchanged (parse skipped), {changed} changed or new")
+
+
+def process_business(row, location, retries=3, pipeline_factory=None, check_fingerprint=None, skip_unchanged=False):
     url = row["g2_url"]
     tries = 0
     success = False
+    # Results shipped elsewhere (e.g. to a coordinator) can't rely on this machine's store
+    if check_fingerprint is None:
+        check_fingerprint = pipeline_factory is None
+    product_id = store.normalize_product_url(url)
+    # Fingerprints are always recorded, but only an opted-in run skips parsing (and CSV output) because of them
+    previous = store.get_review_store().fingerprint(product_id) if check_fingerprint and skip_unchanged else None
 
     while tries <= retries and not success:
 
-        driver = webdriver.Chrome(options=OPTIONS)
-        driver.get(get_scrapeops_url(url, location=location))
-
+        driver = DRIVER_POOL.acquire()
+        driver_ok = False
+        review_pipeline = None
+        unchanged = False
         try:
-            review_cards = driver.find_elements(By.CSS_SELECTOR, "div[class='paper paper--white paper--box mb-2 position-relative border-bottom']")
-
-
-            review_pipeline = DataPipeline(csv_filename=f"{row['name'].replace(' ', '-')}.csv")
-            anon_count = 0
-            for review_card in review_cards:
-                review_date = review_card.find_elements(By.CSS_SELECTOR, "time")
-                has_text = len(review_card.find_elements(By.CSS_SELECTOR, "div[itemprop='reviewBody']")) > 0
-                if len(review_date) > 0 and has_text:
-                    date = review_date[0].get_attribute("datetime")
-                    name_array = review_card.find_elements(By.CSS_SELECTOR, "a[class='link--header-color']")
-                    name = name_array[0].text if len(name_array) > 0 else "anonymous"
-                    if name == "anonymous":
-                        name = f"{name}-{anon_count}"
-                        anon_count += 1
-
-
-                    job_title_array = review_card.find_elements(By.CSS_SELECTOR, "div[class='mt-4th']")
-                    job_title = job_title_array[0].text if len(job_title_array) > 0 else "n/a"
-
-                    rating_container = review_card.find_element(By.CSS_SELECTOR, "div[class='f-1 d-f ai-c mb-half-small-only']")
-                    rating_div = rating_container.find_element(By.CSS_SELECTOR, "div")
-
-                    rating_class = rating_div.get_attribute("class")
-
-                    stars_string = rating_class[-1]
-                    stars_large_number = float(stars_string.split("-")[-1])
-                    stars_clean_number = stars_large_number/2
-
-                    review_body = review_card.find_element(By.CSS_SELECTOR, "div[itemprop='reviewBody']").text
-
-                    info_container = review_card.find_element(By.CSS_SELECTOR, "div[class='tags--teal']")
-                    incentives_dirty = info_container.find_elements(By.CSS_SELECTOR, "div")
-                    incentives_clean = []
-                    source = ""
-                    for incentive in incentives_dirty:
-                        if incentive.text not in incentives_clean:
-                            if "Review source:" in incentive.text:
-                                source = incentive.text.split(": ")[-1]
-                            else:
-                                incentives_clean.append(incentive.text)
-                    validated = "Validated Reviewer" in incentives_clean
-                    incentivized = "Incentivized Review" in incentives_clean
-
-
-                    review_data = ReviewData(
-                        name=name,
-                        date=date,
-                        job_title=job_title,
-                        rating=stars_clean_number,
-                        full_review=review_body,
-                        review_source=source,
-                        validated=validated,
-                        incentivized=incentivized
-                    )                    
-                    
-                    review_pipeline.add_data(review_data)
-
+            if pipeline_factory:
+                review_pipeline = pipeline_factory(row)
+            else:
+                review_pipeline = product_review_pipeline(row)
+
+            with WATCHDOG.watch(driver, TIMEOUTS["job"], url):
+                load_page(driver, url, "product", location=location, route=route_for_attempt(tries))
+                fingerprint = page_fingerprint(driver, row) if check_fingerprint else None
+                unchanged = previous is not None and fingerprint_matches(previous, fingerprint)
+                if not unchanged:
+                    parse_review_page(driver, review_pipeline, url=url)
 
             review_pipeline.close_pipeline()
+            # Only remembered once the reviews it describes are committed
+            if check_fingerprint:
+                store.get_review_store().save_fingerprint(product_id, fingerprint)
             success = True
 
+        except PageRejected as e:
+            review_pipeline.rollback()
+            driver_ok = True
+            logger.warning(f"{e}, retrying via {route_for_attempt(tries + 1)['name']} route, retries left {retries-tries}")
+            tries += 1
+
         except Exception as e:
+            if review_pipeline:
+                review_pipeline.rollback()
+            METRICS.record("page_error", url=url, page_type="product")
             logger.error(f"Exception thrown: {e}")
             logger.warning(f"Failed to process page: {row['g2_url']}")
             logger.warning(f"Retries left: {retries-tries}")
             tries += 1
 
         finally:
-            driver.quit()
+            DRIVER_POOL.release(driver, healthy=success or driver_ok)
     if not success:
         raise Exception(f"Max Retries exceeded: {retries}")
+    elif unchanged:
+        METRICS.incr("fingerprint_unchanged")
+        logger.info(f"Unchanged since last run: {row['g2_url']}")
+        return "unchanged"
     else:
+        if check_fingerprint:
+            METRICS.incr("fingerprint_changed")
         logger.info(f"Successfully parsed: {row['g2_url']}")
+        return "scraped"
 
 
 
 
-def process_results(csv_file, location, max_threads=5, retries=3):
+class DeadLetterFile:
+
+    def __init__(self, csv_filename, fieldnames):
+        self.csv_filename = csv_filename
+        # Same columns as the input so the file can be fed straight back into process_results
+        self.fieldnames = list(fieldnames) + ([] if "error" in fieldnames else ["error"])
+        self.count = 0
+
+    def write(self, row, error):
+        mode = "a" if self.count else "w"
+        with open(self.csv_filename, mode=mode, newline="", encoding="utf-8") as output_file:
+            writer = csv.DictWriter(output_file, fieldnames=self.fieldnames)
+            if not self.count:
+                writer.writeheader()
+            writer.writerow({**row, "error": str(error)})
+        self.count += 1
+
+
+def process_results(csv_file, location, max_threads=5, retries=3, product_registry=None, keyword="", max_in_flight=None, skip_unchanged=False):
     logger.info(f"processing {csv_file}")
+    max_in_flight = max_in_flight or max_threads * 2
+    completed = 0
+
     with open(csv_file, newline="") as file:
-        reader = list(csv.DictReader(file))
+        reader = csv.DictReader(file)
+        dead_letters = DeadLetterFile(f"{os.path.splitext(csv_file)[0]}-failed.csv", reader.fieldnames or [])
+        in_flight = {}
+
+        def collect(futures):
+            nonlocal completed
+            for future in futures:
+                row = in_flight.pop(future)
+                if future.exception():
+                    logger.error(f"Failed {row['g2_url']}: {future.exception()}")
+                    dead_letters.write(row, future.exception())
+                else:
+                    completed += 1
 
         with concurrent.futures.ThreadPoolExecutor(max_workers=max_threads) as executor:
-            executor.map(
-                process_business,
-                reader,
-                [location] * len(reader),
-                [retries] * len(reader)
+            for row in reader:
+                if product_registry and not product_registry.register(row["g2_url"], keyword, row["name"]):
+                    continue
+                if len(in_flight) >= max_in_flight:
+                    done, _ = concurrent.futures.wait(in_flight, return_when=concurrent.futures.FIRST_COMPLETED)
+                    collect(done)
+                in_flight[executor.submit(process_business, row, location, retries, skip_unchanged=skip_unchanged)] = row
+            collect(list(concurrent.futures.as_completed(list(in_flight))))
+
+    logger.info(f"{csv_file}: {completed} products scraped, {dead_letters.count} failed")
+    if dead_letters.count:
+        logger.info(f"Re-run failures with: retry-failed --csv {dead_letters.csv_filename}")
+    return completed, dead_letters.count
+
+def bench_records(count=1_000_000):
+    started = time.perf_counter()
+    reviews = [
+        ReviewData(
+            name=f" Reviewer {number} ",
+            date="2024-05-01",
+            job_title="Operations Analyst ",
+            rating=4.5,
+            full_review="Easy to set up, great mobile app and quick transfers. ",
+            review_source="",
+            validated=True,
+            incentivized=number % 3 == 0
+        )
+        for number in range(count)
+    ]
+    construct_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    with open(os.devnull, "w", newline="") as sink:
+        writer = csv.writer(sink)
+        writer.writerow(ReviewData.FIELD_NAMES)
+        writer.writerows(review.to_row() for review in reviews)
+    serialize_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    batch = RecordBatch(ReviewData)
+    batch.extend(reviews)
+    del reviews
+    with open(os.devnull, "w", newline="") as sink:
+        batch.write_csv(sink)
+    batch_seconds = time.perf_counter() - started
+
+    logger.info(f"Constructed {count} reviews in {construct_seconds:.2f}s ({construct_seconds / count * 1e6:.2f} us each)")
+    logger.info(f"Serialized {count} reviews to CSV in {serialize_seconds:.2f}s")
+    logger.info(f"Packed and serialized a {len(batch)} row batch in {batch_seconds:.2f}s")
+    return {"construct": construct_seconds, "serialize": serialize_seconds, "batch": batch_seconds}
+
+
+## Multi-keyword scheduling
+class CrawlScheduler:
+
+    def __init__(self, max_threads=5, retries=3, progress_interval=30, product_registry=None, skip_unchanged=False):
+        self.product_registry = product_registry or ProductRegistry()
+        self.max_threads = max_threads
+        self.retries = retries
+        self.skip_unchanged = skip_unchanged
+        self.progress_interval = progress_interval
+        self.condition = threading.Condition()
+        self.queues = {}
+        self.rotation = deque()
+        self.in_flight = 0
+        self.pages = {}
+        self.max_pages = {}
+        self.exhausted = set()
+        self.pipelines = {}
+        self.progress = {}
+
+    def add_keyword(self, keyword, location, pages):
+        key = (keyword, location)
+        filename = keyword.replace(" ", "-")
+        if any(existing == keyword for existing, _ in self.pipelines):
+            filename = f"{filename}-{location}"
+        # Only page 1 is queued up front, it tells us how many more to fetch
+        self.pages[key] = 1
+        self.max_pages[key] = pages
+        self.progress[key] = Counter()
+        self.pipelines[key] = StreamingPipeline(
+            csv_filename=f"{filename}.csv",
+            on_accept=lambda search_data: self.add_product(key, search_data),
+            on_flush=store.product_indexer(keyword)
+        )
+        self.submit(key, "search", 0)
+        return self.pipelines[key].csv_filename
+
+    def add_product(self, key, search_data):
+        if self.product_registry.register(search_data.g2_url, key[0], search_data.name):
+            self.submit(key, "product", search_data.to_dict())
+        else:
+            self.progress[key]["product_shared"] += 1
+
+    def submit(self, key, kind, payload):
+        with self.condition:
+            queue = self.queues.setdefault(key, deque())
+            if not queue:
+                self.rotation.append(key)
+            queue.append((kind, payload))
+            self.progress[key][f"{kind}_queued"] += 1
+            self.condition.notify()
+
+    def next_job(self):
+        # Round-robin over keywords so one big keyword can't starve the rest
+        with self.condition:
+            while True:
+                if self.rotation:
+                    key = self.rotation.popleft()
+                    job = self.queues[key].popleft()
+                    if self.queues[key]:
+                        self.rotation.append(key)
+                    self.in_flight += 1
+                    return key, job
+                if self.in_flight == 0:
+                    self.condition.notify_all()
+                    return None
+                self.condition.wait()
+
+    def finish_job(self, key, kind, ok):
+        with self.condition:
+            self.in_flight -= 1
+            self.progress[key][f"{kind}_{'done' if ok else 'failed'}"] += 1
+            searched = self.progress[key]["search_done"] + self.progress[key]["search_failed"]
+            search_finished = kind == "search" and searched == self.pages[key]
+            self.condition.notify_all()
+        if search_finished:
+            self.pipelines[key].close_pipeline()
+            logger.info(f"Search crawl complete for {key[0]} ({key[1]})")
+
+    def run_job(self, key, kind, payload):
+        keyword, location = key
+        if kind == "search":
+            if key in self.exhausted:
+                return
+            result = scrape_search_results(keyword, location, payload, self.pipelines[key], self.retries, detect_pages=payload == 0)
+            if result["exhausted"]:
+                self.exhausted.add(key)
+            if payload == 0:
+                page_count = pages_to_fetch(result, self.max_pages[key])
+                with self.condition:
+                    self.pages[key] = page_count
+                for page in range(1, page_count):
+                    self.submit(key, "search", page)
+        else:
+            process_business(payload, location, self.retries, skip_unchanged=self.skip_unchanged)
+
+    def worker(self):
+        while True:
+            next_job = self.next_job()
+            if next_job is None:
+                return
+            key, (kind, payload) = next_job
+            try:
+                self.run_job(key, kind, payload)
+                ok = True
+            except Exception as e:
+                logger.error(f"{kind} job failed for {key[0]}: {e}")
+                ok = False
+            self.finish_job(key, kind, ok)
+
+    def progress_report(self):
+        with self.condition:
+            report = {}
+            for (keyword, location), counts in self.progress.items():
+                report[f"{keyword} ({location})"] = (
+                    f"search {counts['search_done']}/{self.pages[(keyword, location)]}"
+                    f" ({counts['search_failed']} failed), "
+                    f"products {counts['product_done']}/{counts['product_queued']}"
+                    f" ({counts['product_failed']} failed, {counts['product_shared']} already scheduled by another keyword)"
+                )
+            return report
+
+    def log_progress(self):
+        for keyword, line in self.progress_report().items():
+            logger.info(f"Progress {keyword}: {line}")
+
+    def run(self):
+        workers = [
+            threading.Thread(target=self.worker, name=f"crawl-worker-{number}")
+            for number in range(self.max_threads)
+        ]
+        for worker in workers:
+            worker.start()
+        live = [worker for worker in workers if worker.is_alive()]
+        while live:
+            # Join whichever worker is still running, an exited one would return at once
+            live[0].join(timeout=self.progress_interval)
+            live = [worker for worker in live if worker.is_alive()]
+            self.log_progress()
+        self.product_registry.save()
+        return [pipeline.csv_filename for pipeline in self.pipelines.values()]
+
+
+## Multi-tab concurrency
+class TabPool:
+
+    def __init__(self, tabs=5, location="us", ready_timeout=READY_TIMEOUT, poll_interval=0.2):
+        self.tabs = tabs
+        self.location = location
+        self.ready_timeout = ready_timeout
+        self.poll_interval = poll_interval
+        self.start_browser()
+
+    def start_browser(self):
+        self.driver = create_driver()
+        self.handles = [self.driver.current_window_handle]
+        for _ in range(self.tabs - 1):
+            self.handles.append(self.open_tab())
+
+    def open_tab(self):
+        self.driver.switch_to.new_window("tab")
+        apply_block_profile(self.driver, self.driver.block_profile)
+        return self.driver.current_window_handle
+
+    def replace_tab(self, handle):
+        # Open the replacement first so closing a broken tab never ends the session
+        self.driver.switch_to.window(handle)
+        new_handle = self.open_tab()
+        self.driver.switch_to.window(handle)
+        self.driver.close()
+        self.driver.switch_to.window(new_handle)
+        self.handles[self.handles.index(handle)] = new_handle
+
+    def navigate(self, handle, url, route=None):
+        self.driver.switch_to.window(handle)
+        # The marker disappears with the old document, so readiness checks can't see a stale page
+        self.driver.execute_script(
+            "window.__g2_stale = true; window.location.href = arguments[0];",
+            get_scrapeops_url(url, location=self.location, route=route)
+        )
+
+    def is_ready(self, handle, page_type):
+        try:
+            self.driver.switch_to.window(handle)
+            return self.driver.execute_script(
+                "return window.__g2_stale === undefined && "
+                "(document.querySelector(arguments[0]) !== null || document.readyState === 'complete');",
+                READY_SELECTORS[page_type]
             )
+        except Exception:
+            # Mid-navigation there is briefly no document to run scripts in
+            return False
+
+    def run(self, jobs, retries=3, stop=None):
+        pending = deque((job, 0) for job in jobs)
+        active = {}
+        failed = []
+
+        def retry_or_fail(job, tries, error):
+            logger.error(f"Tab failed on {job['url']}: {error}")
+            if tries < retries:
+                logger.info(f"Retrying request for page: {job['url']}, retries left {retries-tries}")
+                pending.append((job, tries + 1))
+            else:
+                failed.append(job)
+
+        def isolate(handle):
+            # True when the whole browser had to be restarted
+            try:
+                self.replace_tab(handle)
+                return False
+            except Exception as e:
+                # The whole browser is gone, requeue everything it was loading
+                logger.warning(f"Browser lost ({e}), restarting with {self.tabs} tabs")
+                for job, tries, _ in active.values():
+                    pending.appendleft((job, tries))
+                active.clear()
+                try:
+                    self.driver.quit()
+                except Exception:
+                    pass
+                self.start_browser()
+                return True
+
+        while pending or active:
+            # Pages already loading still finish, nothing new is started
+            if stop is not None and stop.is_set():
+                pending.clear()
+            for handle in list(self.handles):
+                if handle in active or not pending:
+                    continue
+                job, tries = pending.popleft()
+                try:
+                    self.navigate(handle, job["url"], route=route_for_attempt(tries))
+                    active[handle] = (job, tries, time.time())
+                except Exception as e:
+                    retry_or_fail(job, tries, e)
+                    if isolate(handle):
+                        # The rest of the snapshot belongs to the old browser
+                        break
+
+            for handle, (job, tries, started) in list(active.items()):
+                if handle not in active:
+                    continue
+                timed_out = time.time() - started > self.ready_timeout
+                if not timed_out and not self.is_ready(handle, job["page_type"]):
+                    continue
+                del active[handle]
+                try:
+                    self.driver.switch_to.window(handle)
+                    logger.info(f"Fetched {job['url']}")
+                    # Byte counts come from the shared browser log, so they are approximate per tab
+                    with WATCHDOG.watch(self.driver, TIMEOUTS["job"], job["url"]):
+                        record_page_fetch(self.driver, job["url"], job["page_type"], started, route=route_for_attempt(tries)["name"])
+                        label = classify_page(self.driver, job["page_type"])
+                        record_classification(job["url"], route_for_attempt(tries), label)
+                        if label != "ok":
+                            raise PageRejected(label, job["url"])
+                        job["handler"](self.driver)
+                except PageRejected as e:
+                    # Only the route failed, the tab itself can be reused
+                    retry_or_fail(job, tries, e)
+                except Exception as e:
+                    retry_or_fail(job, tries, e)
+                    isolate(handle)
+
+            time.sleep(self.poll_interval)
+
+        return failed
+
+    def close(self):
+        self.driver.quit()
+
+
+def run_tab_jobs(jobs, location, tabs=5, retries=3):
+    pool = TabPool(tabs=tabs, location=location)
+    try:
+        failed = pool.run(jobs, retries=retries)
+    finally:
+        pool.close()
+    for job in failed:
+        logger.error(f"Max Retries exceeded: {retries} for {job['url']}")
+    return failed
+
+
+def start_scrape_tabs(keyword, pages, location, data_pipeline=None, tabs=5, retries=3):
+    # Same sizing as start_scrape: pages is an upper bound, the real page count is read from page 1
+    first_page = {"cards": 0, "new": 0, "page_count": None, "exhausted": False}
+    stop = threading.Event()
+
+    def parse_first_page(driver):
+        first_page["cards"], first_page["new"] = parse_search_page(driver, data_pipeline)
+        first_page["page_count"] = detect_page_count(driver)
+        first_page["exhausted"] = first_page["cards"] == 0 or first_page["new"] == 0
+
+    def page_handler(page_number):
+
+        def handler(driver):
+            cards, new = parse_search_page(driver, data_pipeline)
+            if cards == 0 or new == 0:
+                logger.info(f"{keyword}: page {page_number+1} had no new products, stopping")
+                stop.set()
+
+        return handler
+
+    pool = TabPool(tabs=tabs, location=location)
+    try:
+        failed = pool.run([{"url": search_url(keyword, 0), "page_type": "search", "handler": parse_first_page}], retries=retries)
+        if not failed:
+            page_count = pages_to_fetch(first_page, pages)
+            logger.info(f"{keyword}: fetching {page_count} pages (listing reports {first_page['page_count']})")
+            jobs = [
+                {"url": search_url(keyword, page), "page_type": "search", "handler": page_handler(page)}
+                for page in range(1, page_count)
+            ]
+            failed = pool.run(jobs, retries=retries, stop=stop)
+    finally:
+        pool.close()
+    for job in failed:
+        logger.error(f"Max Retries exceeded: {retries} for {job['url']}")
+    return failed
+
+
+def review_page_handler(row):
+
+    def handler(driver):
+        review_pipeline = product_review_pipeline(row)
+        try:
+            parse_review_page(driver, review_pipeline, url=row["g2_url"])
+            review_pipeline.close_pipeline()
+        except Exception:
+            review_pipeline.rollback()
+            raise
+        logger.info(f"Successfully parsed: {row['g2_url']}")
+
+    return handler
+
+
+def process_results_tabs(csv_file, location, tabs=5, retries=3, product_registry=None, keyword=""):
+    logger.info(f"processing {csv_file}")
+    with open(csv_file, newline="") as file:
+        jobs = [
+            {"url": row["g2_url"], "page_type": "product", "handler": review_page_handler(row)}
+            for row in csv.DictReader(file)
+            if product_registry is None or product_registry.register(row["g2_url"], keyword, row["name"])
+        ]
+    return run_tab_jobs(jobs, location, tabs=tabs, retries=retries)
+
+
+def finish_run():
+    # Shared by every entry point that drove browsers: this script, workers and the daemon
+    DRIVER_POOL.close()
+    DRIVER_POOL.log_memory_summary()
+    reap_orphaned_browsers()
+    logger.info(f"Block rate per proxy route: {route_block_rates()}")
+    log_fingerprint_savings()
+    METRICS.log_summary()
+
 
 if __name__ == "__main__":
 
     MAX_RETRIES = 3
     MAX_THREADS = 5
-    PAGES = 10
+    PAGES = 50  # upper bound, the listing's own page count is read from page 1
     LOCATION = "us"
 
-    logger.info(f"Crawl starting...")
+    parser = argparse.ArgumentParser()
+    parser.add_argument("mode", nargs="?", default="local", choices=["local", "compare-blocking", "retry-failed", "bench-records"])
+    parser.add_argument("--threads", type=int, default=MAX_THREADS)
+    parser.add_argument("--tabs", type=int, default=0, help="serve pages from tabs of one browser instead of one browser per thread")
+    parser.add_argument("--stream", action="store_true", help="crawl all keywords at once, scraping reviews as soon as each product is found")
+    parser.add_argument("--csv", help="product CSV to (re)process in retry-failed mode")
+    parser.add_argument("--skip-unchanged", action="store_true", help="don't re-parse products whose page fingerprint matches the last run, no review CSV is written for them")
+    parser.add_argument("--url", default="https://www.g2.com/search?query=online+bank")
+    args = parser.parse_args()
+    if args.mode == "retry-failed" and not args.csv:
+        parser.error("retry-failed mode requires --csv")
 
     ## INPUT ---> List of keywords to scrape
     keyword_list = ["online bank"]
+    location_list = [LOCATION]
     aggregate_files = []
 
-    ## Job Processes
-    for keyword in keyword_list:
-        filename = keyword.replace(" ", "-")
+    if args.mode == "compare-blocking":
+        compare_block_profiles(args.url, location=LOCATION)
 
-        crawl_pipeline = DataPipeline(csv_filename=f"{filename}.csv")
-        start_scrape(keyword, PAGES, LOCATION, data_pipeline=crawl_pipeline, max_threads=MAX_THREADS, retries=MAX_RETRIES)
-        crawl_pipeline.close_pipeline()
-        aggregate_files.append(f"{filename}.csv")
-    logger.info(f"Crawl complete.")
+    elif args.mode == "bench-records":
+        bench_records()
+
+    elif args.mode == "retry-failed":
+        process_results(args.csv, LOCATION, max_threads=args.threads, retries=MAX_RETRIES, skip_unchanged=args.skip_unchanged)
+
+    elif args.stream:
+        logger.info(f"Crawl starting...")
+        scheduler = CrawlScheduler(max_threads=args.threads, retries=MAX_RETRIES, skip_unchanged=args.skip_unchanged)
+        for keyword in keyword_list:
+            for location in location_list:
+                scheduler.add_keyword(keyword, location, PAGES)
+        scheduler.run()
+        logger.info(f"Crawl complete.")
+
+    else:
+        logger.info(f"Crawl starting...")
+
+        ## Job Processes
+        for keyword in keyword_list:
+            filename = keyword.replace(" ", "-")
+
+            crawl_pipeline = DataPipeline(csv_filename=f"{filename}.csv", on_flush=store.product_indexer(keyword))
+            if args.tabs:
+                start_scrape_tabs(keyword, PAGES, LOCATION, data_pipeline=crawl_pipeline, tabs=args.tabs, retries=MAX_RETRIES)
+            else:
+                start_scrape(keyword, PAGES, LOCATION, data_pipeline=crawl_pipeline, max_threads=args.threads, retries=MAX_RETRIES)
+            crawl_pipeline.close_pipeline()
+            aggregate_files.append((keyword, f"{filename}.csv"))
+        logger.info(f"Crawl complete.")
+
+        product_registry = ProductRegistry()
+        for keyword, file in aggregate_files:
+            if args.tabs:
+                process_results_tabs(file, LOCATION, tabs=args.tabs, retries=MAX_RETRIES, product_registry=product_registry, keyword=keyword)
+            else:
+                process_results(
+                    file, LOCATION, max_threads=args.threads, retries=MAX_RETRIES, product_registry=product_registry,
+                    keyword=keyword, skip_unchanged=args.skip_unchanged
+                )
+        product_registry.save()
+        store.log_keyword_summaries(keyword_list)
 
-    for file in aggregate_files:
-        process_results(file, LOCATION, max_threads=MAX_THREADS, retries=MAX_RETRIES) 
\ No newline at end of file
+    finish_run()
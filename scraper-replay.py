@@ -0,0 +1,742 @@
+import os
+import re
+import sys
+import json
+import time
+import logging
+import argparse
+import tempfile
+import threading
+import importlib.util
+from functools import lru_cache
+from html.parser import HTMLParser
+from urllib.parse import urlsplit, parse_qs, urljoin
+
+try:
+    from selenium.common.exceptions import NoSuchElementException
+except ImportError:
+    class NoSuchElementException(Exception):
+        pass
+
+
+## Logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+FIXTURES_DIR = "fixtures"
+EMPTY_PAGE = "<html><head></head><body></body></html>"
+
+VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "track", "wbr"}
+HIDDEN_TAGS = {"head", "script", "style", "noscript", "template", "title"}
+BLOCK_TAGS = {
+    "address", "article", "aside", "blockquote", "br", "dd", "div", "dl", "dt", "fieldset", "figcaption", "figure",
+    "footer", "form", "h1", "h2", "h3", "h4", "h5", "h6", "header", "hr", "li", "main", "nav", "ol", "p", "pre",
+    "section", "table", "tr", "ul"
+}
+URL_ATTRIBUTES = {"href", "src", "action"}
+
+
+## HTML tree
+class Node:
+    __slots__ = ("tag", "attrs", "children", "parent")
+
+    def __init__(self, tag, attrs=None, parent=None):
+        self.tag = tag
+        self.attrs = attrs or {}
+        # Child nodes and text strings, in document order
+        self.children = []
+        self.parent = parent
+
+    def descendants(self):
+        stack = [child for child in reversed(self.children) if child.__class__ is Node]
+        while stack:
+            node = stack.pop()
+            yield node
+            stack.extend(child for child in reversed(node.children) if child.__class__ is Node)
+
+
+class TreeBuilder(HTMLParser):
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.root = Node("#document")
+        self.stack = [self.root]
+
+    def handle_starttag(self, tag, attrs):
+        node = Node(tag, {name: value or "" for name, value in attrs}, self.stack[-1])
+        self.stack[-1].children.append(node)
+        if tag not in VOID_TAGS:
+            self.stack.append(node)
+
+    def handle_startendtag(self, tag, attrs):
+        node = Node(tag, {name: value or "" for name, value in attrs}, self.stack[-1])
+        self.stack[-1].children.append(node)
+
+    def handle_endtag(self, tag):
+        # Close back to the matching open tag, like a browser does with unclosed children
+        for index in range(len(self.stack) - 1, 0, -1):
+            if self.stack[index].tag == tag:
+                del self.stack[index:]
+                return
+
+    def handle_data(self, data):
+        self.stack[-1].children.append(data)
+
+
+def parse_html(html):
+    builder = TreeBuilder()
+    builder.feed(html)
+    builder.close()
+    return builder.root
+
+
+def node_text(node):
+    # Roughly Selenium's rendered text: hidden tags dropped, blocks on their own lines, whitespace collapsed
+    parts = []
+    stack = [node]
+    while stack:
+        item = stack.pop()
+        if item.__class__ is str:
+            parts.append(item)
+            continue
+        if item.tag in HIDDEN_TAGS and item is not node:
+            continue
+        block = item.tag in BLOCK_TAGS
+        if block:
+            parts.append("\n")
+            stack.append("\n")
+        stack.extend(reversed(item.children))
+    lines = (" ".join(line.split()) for line in "".join(parts).split("\n"))
+    return "\n".join(line for line in lines if line)
+
+
+## CSS selectors
+SELECTOR_TOKEN = re.compile(r"""
+    \s*(?P<combinator>[>+~,])\s*
+  | (?P<space>\s+)
+  | (?P<tag>\*|[a-zA-Z][\w-]*)
+  | \#(?P<id>[\w-]+)
+  | \.(?P<class_name>[\w-]+)
+  | \[\s*(?P<attr>[\w:-]+)\s*(?:(?P<op>[~|^$*]?=)\s*(?:'(?P<single>[^']*)'|"(?P<double>[^"]*)"|(?P<bare>[^\]\s]+))\s*)?\]
+""", re.VERBOSE)
+
+
+@lru_cache(maxsize=1024)
+def compile_selector(selector):
+    # "a b, c > d" -> [[(None, a), (" ", b)], [(None, c), (">", d)]], each step a (tag, conditions) pair
+    groups = []
+    chain = []
+    compound = None
+    combinator = None
+    position = 0
+    selector = selector.strip()
+    while position < len(selector):
+        match = SELECTOR_TOKEN.match(selector, position)
+        if match is None:
+            raise ValueError(f"Unsupported selector {selector!r} at {position}")
+        position = match.end()
+
+        symbol = match.group("combinator") or (" " if match.group("space") else None)
+        if symbol:
+            if compound is None:
+                raise ValueError(f"Unsupported selector {selector!r} at {position}")
+            chain.append((combinator, tuple(compound[0:1]) + (tuple(compound[1]),)))
+            compound = None
+            if symbol == ",":
+                groups.append(chain)
+                chain = []
+                combinator = None
+            elif symbol in "+~":
+                raise ValueError(f"Sibling combinators are not supported: {selector!r}")
+            else:
+                combinator = symbol
+            continue
+
+        if compound is None:
+            compound = [None, []]
+        if match.group("tag"):
+            compound[0] = None if match.group("tag") == "*" else match.group("tag").lower()
+        elif match.group("id"):
+            compound[1].append(("id", "=", match.group("id")))
+        elif match.group("class_name"):
+            compound[1].append(("class", "~=", match.group("class_name")))
+        else:
+            value = next((value for value in match.group("single", "double", "bare") if value is not None), None)
+            compound[1].append((match.group("attr").lower(), match.group("op"), value))
+
+    if compound is None:
+        raise ValueError(f"Unsupported selector {selector!r}")
+    chain.append((combinator, tuple(compound[0:1]) + (tuple(compound[1]),)))
+    groups.append(chain)
+    return groups
+
+
+def attribute_matches(actual, op, expected):
+    if actual is None:
+        return False
+    if op is None:
+        return True
+    if op == "=":
+        return actual == expected
+    if op == "~=":
+        return expected in actual.split()
+    if op == "*=":
+        return expected in actual
+    if op == "^=":
+        return actual.startswith(expected)
+    if op == "$=":
+        return actual.endswith(expected)
+    return actual == expected or actual.startswith(f"{expected}-")
+
+
+def compound_matches(node, compound):
+    tag, conditions = compound
+    if tag is not None and node.tag != tag:
+        return False
+    return all(attribute_matches(node.attrs.get(name), op, value) for name, op, value in conditions)
+
+
+def chain_matches(node, chain, index):
+    combinator, compound = chain[index]
+    if not compound_matches(node, compound):
+        return False
+    if index == 0:
+        return True
+    parent = node.parent
+    if combinator == ">":
+        return parent is not None and parent.tag != "#document" and chain_matches(parent, chain, index - 1)
+    # Ancestors outside the search scope count too, same as querySelectorAll
+    while parent is not None and parent.tag != "#document":
+        if chain_matches(parent, chain, index - 1):
+            return True
+        parent = parent.parent
+    return False
+
+
+def select(scope, selector):
+    groups = compile_selector(selector)
+    return [
+        node for node in scope.descendants()
+        if any(chain_matches(node, chain, len(chain) - 1) for chain in groups)
+    ]
+
+
+def locator_selector(by, value):
+    # Selenium's By values are plain strings, so this works with or without selenium installed
+    if by == "css selector":
+        return value
+    if by == "tag name":
+        return value
+    if by == "id":
+        return f"[id='{value}']"
+    if by == "class name":
+        return f"[class~='{value}']"
+    if by == "name":
+        return f"[name='{value}']"
+    raise ValueError(f"Replay driver doesn't support locating by {by}")
+
+
+## Replay driver
+class ReplayElement:
+
+    def __init__(self, node, driver):
+        self.node = node
+        self.driver = driver
+
+    @property
+    def tag_name(self):
+        return self.node.tag
+
+    @property
+    def text(self):
+        return node_text(self.node)
+
+    def get_attribute(self, name):
+        value = self.node.attrs.get(name)
+        # Like a real browser, links come back absolute
+        if value is not None and name in URL_ATTRIBUTES:
+            return urljoin(self.driver.current_url, value)
+        return value
+
+    def get_dom_attribute(self, name):
+        return self.node.attrs.get(name)
+
+    def is_displayed(self):
+        return True
+
+    def find_elements(self, by="id", value=None):
+        return [ReplayElement(node, self.driver) for node in select(self.node, locator_selector(by, value))]
+
+    def find_element(self, by="id", value=None):
+        elements = self.find_elements(by, value)
+        if not elements:
+            raise NoSuchElementException(f"No element matches {value!r}")
+        return elements[0]
+
+    def __eq__(self, other):
+        return isinstance(other, ReplayElement) and other.node is self.node
+
+    def __hash__(self):
+        return id(self.node)
+
+
+class FixtureSet:
+
+    def __init__(self, directory=FIXTURES_DIR):
+        self.directory = directory
+        with open(os.path.join(directory, "manifest.json"), encoding="utf-8") as manifest_file:
+            self.entries = json.load(manifest_file)["fixtures"]
+        # Entries without a pattern are only loaded directly, e.g. the later version of a page
+        self.routes = [(re.compile(entry["pattern"]), entry["file"]) for entry in self.entries if "pattern" in entry]
+        self.lock = threading.Lock()
+        self.pages = {}
+
+    def page(self, filename):
+        # Parsed once and shared read-only by every driver
+        with self.lock:
+            if filename not in self.pages:
+                with open(os.path.join(self.directory, filename), encoding="utf-8") as fixture_file:
+                    html = fixture_file.read()
+                self.pages[filename] = (html, parse_html(html))
+            return self.pages[filename]
+
+    def match(self, url):
+        for pattern, filename in self.routes:
+            if pattern.search(url):
+                return self.page(filename)
+        return None
+
+
+fixture_sets = {}
+fixture_sets_lock = threading.Lock()
+
+
+def get_fixture_set(directory=FIXTURES_DIR):
+    with fixture_sets_lock:
+        if directory not in fixture_sets:
+            fixture_sets[directory] = FixtureSet(directory)
+        return fixture_sets[directory]
+
+
+def unwrap_proxy_url(url):
+    # get_scrapeops_url wraps the real target in ?url=
+    parts = urlsplit(url)
+    if parts.netloc.endswith("scrapeops.io"):
+        target = parse_qs(parts.query).get("url")
+        if target:
+            return target[0]
+    return url
+
+
+class SwitchTo:
+
+    def __init__(self, driver):
+        self.driver = driver
+
+    def window(self, handle):
+        self.driver.current_window_handle = handle
+
+
+class ReplayDriver:
+
+    def __init__(self, fixtures_dir=FIXTURES_DIR, latency=0.0):
+        self.fixtures = get_fixture_set(fixtures_dir)
+        self.latency = latency
+        self.block_profile = "none"
+        self.current_url = "about:blank"
+        self.current_window_handle = "replay-0"
+        self.window_handles = ["replay-0"]
+        self.switch_to = SwitchTo(self)
+        self.requests = []
+        self.closed = False
+        self.loaded_at = time.perf_counter()
+        self.page_source, self.document = EMPTY_PAGE, parse_html(EMPTY_PAGE)
+
+    def get(self, url):
+        target = unwrap_proxy_url(url)
+        self.requests.append(url)
+        if self.latency:
+            time.sleep(self.latency)
+        page = self.fixtures.match(target)
+        if page is None:
+            logger.warning(f"No fixture for {target}, serving an empty page")
+            page = (EMPTY_PAGE, parse_html(EMPTY_PAGE))
+        self.page_source, self.document = page
+        self.current_url = target
+        self.loaded_at = time.perf_counter()
+
+    @property
+    def title(self):
+        titles = select(self.document, "title")
+        return node_text(titles[0]) if titles else ""
+
+    def find_elements(self, by="id", value=None):
+        return [ReplayElement(node, self) for node in select(self.document, locator_selector(by, value))]
+
+    def find_element(self, by="id", value=None):
+        elements = self.find_elements(by, value)
+        if not elements:
+            raise NoSuchElementException(f"No element matches {value!r}")
+        return elements[0]
+
+    def execute_script(self, script, *args):
+        # Only the timing probes the scraper uses; the page "loaded" the moment get() returned
+        elapsed_ms = (time.perf_counter() - self.loaded_at) * 1000
+        if "loadEventEnd" in script:
+            return [elapsed_ms, elapsed_ms]
+        if "performance.now()" in script:
+            return elapsed_ms
+        return None
+
+    def execute_cdp_cmd(self, command, params):
+        return {}
+
+    def get_log(self, log_type):
+        return []
+
+    def set_page_load_timeout(self, seconds):
+        pass
+
+    def set_script_timeout(self, seconds):
+        pass
+
+    def implicitly_wait(self, seconds):
+        pass
+
+    def load_fixture(self, filename):
+        self.page_source, self.document = self.fixtures.page(filename)
+        self.loaded_at = time.perf_counter()
+
+    def quit(self):
+        self.closed = True
+
+
+## Running the scraper against fixtures
+def load_module(name, path):
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    # Registered so sibling scripts loaded later (e.g. the coordinator) share this copy
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def load_scraper(path="scraper-proxy.py", fixtures_dir=FIXTURES_DIR):
+    scraper = load_module("scraper_proxy", path)
+    # Fixtures are already complete, there is nothing to wait for
+    scraper.READY_TIMEOUT = 0.05
+    scraper.METRICS.filename = ""
+    scraper.DRIVER_POOL.driver_factory = lambda: ReplayDriver(fixtures_dir)
+    return scraper
+
+
+def fixture_url(scraper, entry):
+    if entry["page_type"] == "search":
+        return scraper.search_url(entry["keyword"], entry["page_number"])
+    return entry["url"]
+
+
+def run_fixture(scraper, entry):
+    # Through the same entry points a crawl uses: pool, proxy URL, ready wait, classification, parsing
+    if entry["page_type"] == "search":
+        pipeline = scraper.CollectorPipeline()
+        result = scraper.scrape_search_results(entry["keyword"], "us", entry["page_number"], pipeline, retries=0, detect_pages=True)
+        pipeline.close_pipeline()
+        return {"cards": result["cards"], "page_count": result["page_count"], "items": pipeline.items}
+    pipelines = []
+
+    def collector(row):
+        pipelines.append(scraper.CollectorPipeline())
+        return pipelines[-1]
+
+    row = {"name": entry["name"], "g2_url": fixture_url(scraper, entry), "stars": ""}
+    scraper.process_business(row, "us", retries=0, pipeline_factory=collector)
+    return {"reviews": len(pipelines[-1].items), "items": pipelines[-1].items}
+
+
+def run_rerun(scraper, entry, fixtures_dir=FIXTURES_DIR):
+    # The page as it was, then as it is now, each pass like a separate run: a fresh identity, one store
+    store = scraper.store.ReviewStore(":memory:")
+    row = {"name": entry["name"], "g2_url": entry["url"], "stars": ""}
+    product_id = scraper.store.normalize_product_url(row["g2_url"])
+    added = []
+    for filename in (entry["previous"], entry["file"]):
+        driver = ReplayDriver(fixtures_dir)
+        driver.load_fixture(filename)
+        flushes = []
+        pipeline = scraper.DataPipeline(
+            review_identity=scraper.ReviewIdentity(),
+            review_scope=product_id,
+            on_flush=lambda reviews, flushes=flushes: flushes.append(store.add_reviews(row, reviews))
+        )
+        scraper.parse_review_page(driver, pipeline, url=row["g2_url"])
+        pipeline.close_pipeline()
+        added.append(sum(flushes))
+    reviews = store.connection.execute("SELECT COUNT(*) FROM reviews WHERE g2_url = ?", (product_id,)).fetchone()[0]
+    summary = store.load_summary("product", product_id)
+    store.connection.close()
+    # Only the rows the second pass added on top of the first
+    return {"reviews": reviews, "added": added[-1], "summary_count": summary.count, "items": []}
+
+
+def check_fixture(scraper, entry, fixtures_dir=FIXTURES_DIR):
+    expect = entry.get("expect", {})
+    problems = []
+    if "rejected" in expect:
+        driver = ReplayDriver(fixtures_dir)
+        try:
+            scraper.load_page(driver, fixture_url(scraper, entry), entry["page_type"])
+            problems.append(f"expected a {expect['rejected']} page, it was accepted")
+        except scraper.PageRejected as e:
+            if e.label != expect["rejected"]:
+                problems.append(f"classified as {e.label}, expected {expect['rejected']}")
+        return problems
+
+    result = run_rerun(scraper, entry, fixtures_dir) if "previous" in entry else run_fixture(scraper, entry)
+    for name in ("cards", "page_count", "reviews", "added", "summary_count"):
+        if name in expect and result.get(name) != expect[name]:
+            problems.append(f"{name} {result.get(name)!r}, expected {expect[name]!r}")
+    if "first" in expect:
+        if not result["items"]:
+            problems.append("nothing extracted")
+        else:
+            first = result["items"][0].to_dict()
+            for name, value in expect["first"].items():
+                if first.get(name) != value and str(first.get(name)) != str(value):
+                    problems.append(f"first {name} {first.get(name)!r}, expected {value!r}")
+    return problems
+
+
+def verify_fixtures(scraper, fixtures_dir=FIXTURES_DIR):
+    failures = 0
+    for entry in get_fixture_set(fixtures_dir).entries:
+        started = time.perf_counter()
+        problems = check_fixture(scraper, entry, fixtures_dir)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        if problems:
+            failures += 1
+            logger.error(f"FAIL {entry['file']} ({elapsed_ms:.1f} ms): {'; '.join(problems)}")
+        else:
+            logger.info(f"ok   {entry['file']} ({elapsed_ms:.1f} ms)")
+    return failures
+
+
+## Component checks, no pages involved
+def expect(problems, label, actual, expected):
+    if actual != expected:
+        problems.append(f"{label} {actual!r}, expected {expected!r}")
+
+
+def check_lease_queue(scraper):
+    coordinator = load_module("scraper_coordinator", os.path.join(os.path.dirname(scraper.__file__), "scraper-coordinator.py"))
+    problems = []
+    queue = coordinator.LeaseQueue(lease_seconds=60, max_attempts=2)
+    for job_id in ("a", "b", "c"):
+        queue.put({"job_id": job_id})
+
+    lease = queue.lease("w1")
+    expect(problems, "first lease", lease["job"]["job_id"], "a")
+    expect(problems, "complete", queue.complete(lease["lease_id"]), {"job_id": "a"})
+    expect(problems, "late complete", queue.complete(lease["lease_id"]), None)
+    expect(problems, "heartbeat on a finished lease", queue.heartbeat(lease["lease_id"]), False)
+
+    # A failure is retried until max_attempts, then dead-lettered
+    lease = queue.lease("w1")
+    expect(problems, "first failure", queue.fail(lease["lease_id"], "boom"), None)
+    queue.lease("w1")  # c
+    lease = queue.lease("w1")
+    expect(problems, "retried job", lease["job"]["job_id"], "b")
+    expect(problems, "last failure", queue.fail(lease["lease_id"], "boom"), {"job_id": "b"})
+
+    # So is a job whose worker keeps dying, without anyone calling fail()
+    for lease in list(queue.leases.values()):
+        lease["expires"] = 0
+    expect(problems, "first expiry", queue.requeue_expired(), [])
+    lease = queue.lease("w2")
+    expect(problems, "re-issued job", lease["job"]["job_id"], "c")
+    queue.leases[lease["lease_id"]]["expires"] = 0
+    expect(problems, "last expiry", queue.requeue_expired(), [{"job_id": "c"}])
+    expect(problems, "lease after dead-letter", queue.lease("w2"), None)
+    expect(problems, "status", queue.status(), {"pending": 0, "leased": 0, "done": 1, "dead": 2})
+    expect(problems, "idle", queue.is_idle(), True)
+    expect(problems, "cancel a dead job", queue.cancel("b"), False)
+    return problems
+
+
+def check_review_identity(scraper):
+    problems = []
+    text = "Easy to set up direct deposit and the app never gets in the way of paying bills"
+    review = lambda **values: scraper.ReviewData(**{"name": "Jordan P.", "date": "2024-05-14", "full_review": text, **values})
+    identity = scraper.ReviewIdentity()
+
+    expect(problems, "first sighting", identity.check(review(), "chime"), False)
+    expect(problems, "exact copy", identity.check(review(full_review=f"  {text.upper()} "), "chime"), True)
+    expect(problems, "another reviewer, same text", identity.check(review(name="Sam K."), "chime"), False)
+    # anonymous-N is the card's position, it moves when reviews are added above
+    expect(problems, "anonymous first", identity.check(review(name="anonymous-1", full_review=f"{text} twice"), "chime"), False)
+    expect(problems, "anonymous moved", identity.check(review(name="anonymous-4", full_review=f"{text} twice"), "chime"), True)
+
+    copied = review()
+    expect(problems, "copy on another product", identity.check(copied, "varo"), False)
+    expect(problems, "copy on another product flagged", copied.near_duplicate, True)
+    unrelated = review(full_review="Customer support took three weeks to answer a simple question about fees")
+    identity.check(unrelated, "varo")
+    expect(problems, "unrelated review flagged", unrelated.near_duplicate, False)
+
+    # A rolled back page must not block its own retry
+    identity.forget([review().identity_hash()], "chime")
+    expect(problems, "after forget", identity.check(review(), "chime"), False)
+
+    bounded = scraper.ReviewIdentity(max_entries=3)
+    for index in range(5):
+        bounded.check(review(full_review=f"{text} {index}"), "chime")
+    expect(problems, "bounded entries", len(bounded.entries), 3)
+    remembered = set()
+    for buckets in bounded.buckets:
+        for bucket in buckets.values():
+            remembered.update(bucket if isinstance(bucket, list) else [bucket])
+    expect(problems, "bucketed entries", remembered, set(bounded.entries))
+    return problems
+
+
+def check_transactional_pipeline(scraper):
+    problems = []
+    review = lambda index: scraper.ReviewData(name=f"Reviewer {index}", date="2024-05-14", rating=5, full_review=f"review number {index} of the batch")
+    with tempfile.TemporaryDirectory() as directory:
+        target = os.path.join(directory, "Chime.csv")
+        identity = scraper.ReviewIdentity()
+        flushed = []
+        pipeline = lambda: scraper.TransactionalPipeline(
+            csv_filename=target, storage_queue_limit=1, review_identity=identity, review_scope="chime", on_flush=flushed.extend
+        )
+
+        first = pipeline()
+        first.add_data(review(1))
+        first.add_data(review(2))
+        # Flushed to the staging file, not yet to the target or downstream
+        expect(problems, "target before commit", os.path.exists(target), False)
+        expect(problems, "flushed before commit", len(flushed), 0)
+        first.close_pipeline()
+        expect(problems, "flushed after commit", len(flushed), 2)
+
+        failed = pipeline()
+        failed.add_data(review(3))
+        failed.rollback()
+        failed.close_pipeline()
+        retry = pipeline()
+        expect(problems, "retry after rollback accepted", retry.add_data(review(3)), True)
+        expect(problems, "committed review accepted again", retry.add_data(review(1)), False)
+        retry.close_pipeline()
+
+        with open(target, newline="", encoding="utf-8") as file:
+            lines = file.read().splitlines()
+        expect(problems, "header rows", sum(line.startswith("name,") for line in lines), 1)
+        expect(problems, "data rows", len(lines) - 1, 3)
+        expect(problems, "flushed rows", len(flushed), 3)
+        expect(problems, "leftover staging files", sorted(os.listdir(directory)), ["Chime.csv"])
+    return problems
+
+
+def check_summaries(scraper):
+    problems = []
+    review_store = scraper.store.ReviewStore(":memory:")
+    product = scraper.SearchData(name="Chime", stars=4.8, g2_url="https://www.g2.com/products/chime/reviews")
+    row = {"name": "Chime", "g2_url": product.g2_url}
+    reviews = [
+        scraper.ReviewData(name="A", date="2024-05-14", rating=5, full_review="first", review_source="Organic", validated=True),
+        scraper.ReviewData(name="B", date="2024-05-15", rating=4, full_review="second", review_source="Organic", incentivized=True),
+        scraper.ReviewData(name="C", date="2024-05-16", rating=3.5, full_review="third", review_source="G2 Invite")
+    ]
+    review_store.add_products("online bank", [product])
+    expect(problems, "added", review_store.add_reviews(row, reviews), 3)
+    expect(problems, "added on a rerun", review_store.add_reviews(row, reviews), 0)
+    product_id = scraper.store.normalize_product_url(product.g2_url)
+    expected = {
+        "reviews": 3, "average_rating": 4.167, "histogram": {"3.5": 1, "4.0": 1, "5.0": 1},
+        "validated_share": 0.3333, "incentivized_share": 0.3333, "sources": {"Organic": 2, "G2 Invite": 1}
+    }
+    expect(problems, "product summary", review_store.summary("product", product_id), expected)
+    expect(problems, "keyword summary", review_store.summary("keyword", "online bank"), expected)
+    # Linking a product later brings its existing reviews into the keyword
+    review_store.add_products("neobank", [product])
+    expect(problems, "late keyword summary", review_store.summary("keyword", "neobank"), expected)
+    with review_store.lock, review_store.connection:
+        review_store.rebuild_summaries()
+    expect(problems, "rebuilt keyword summary", review_store.summary("keyword", "neobank"), expected)
+    review_store.close()
+    return problems
+
+
+COMPONENT_CHECKS = [check_lease_queue, check_review_identity, check_transactional_pipeline, check_summaries]
+
+
+def verify_components(scraper):
+    failures = 0
+    for check in COMPONENT_CHECKS:
+        problems = check(scraper)
+        if problems:
+            failures += 1
+            logger.error(f"FAIL {check.__name__}: {'; '.join(problems)}")
+        else:
+            logger.info(f"ok   {check.__name__}")
+    return failures
+
+
+def bench_parsers(scraper, fixtures_dir=FIXTURES_DIR, iterations=200):
+    fixtures = get_fixture_set(fixtures_dir)
+    for entry in fixtures.entries:
+        if "rejected" in entry.get("expect", {}) or "previous" in entry:
+            continue
+        driver = ReplayDriver(fixtures_dir)
+        url = fixture_url(scraper, entry)
+        driver.get(url)
+
+        started = time.perf_counter()
+        for _ in range(iterations):
+            pipeline = scraper.CollectorPipeline()
+            if entry["page_type"] == "search":
+                scraper.parse_search_page(driver, pipeline)
+            else:
+                scraper.parse_review_page(driver, pipeline, url=url)
+            pipeline.close_pipeline()
+        parse_ms = (time.perf_counter() - started) * 1000 / iterations
+
+        started = time.perf_counter()
+        for _ in range(iterations):
+            parse_html(driver.page_source)
+        tree_ms = (time.perf_counter() - started) * 1000 / iterations
+
+        started = time.perf_counter()
+        runs = max(iterations // 10, 1)
+        for _ in range(runs):
+            run_fixture(scraper, entry)
+        end_to_end_ms = (time.perf_counter() - started) * 1000 / runs
+
+        records = len(pipeline.items)
+        logger.info(
+            f"{entry['file']}: extract {parse_ms:.2f} ms/page ({records} records, "
+            f"{records / parse_ms * 1000:.0f} records/s), HTML parse {tree_ms:.2f} ms/page, "
+            f"{'scrape_search_results' if entry['page_type'] == 'search' else 'process_business'} {end_to_end_ms:.2f} ms/call"
+        )
+
+
+if __name__ == "__main__":
+
+    SCRAPER = "scraper-proxy.py"
+    ITERATIONS = 200
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("mode", nargs="?", default="verify", choices=["verify", "bench"])
+    parser.add_argument("--scraper", default=SCRAPER)
+    parser.add_argument("--fixtures", default=FIXTURES_DIR)
+    parser.add_argument("--iterations", type=int, default=ITERATIONS)
+    args = parser.parse_args()
+
+    scraper = load_scraper(args.scraper, args.fixtures)
+    if args.mode == "bench":
+        bench_parsers(scraper, args.fixtures, args.iterations)
+    else:
+        failures = verify_fixtures(scraper, args.fixtures) + verify_components(scraper)
+        scraper.DRIVER_POOL.close()
+        raise SystemExit(1 if failures else 0)
@@ -0,0 +1,315 @@
+import json
+import math
+import heapq
+import random
+import logging
+import argparse
+from collections import Counter, defaultdict, deque
+
+
+## Logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+ROUTES = ["default", "residential", "bypass"]  # same rotation as PROXY_ROUTES in scraper-proxy.py
+ROUTE_CREDITS = {"default": 1, "residential": 10, "bypass": 10}  # credits per request, set these from your proxy plan
+DRIVER_MAX_PAGES = 50
+RESULTS_PER_PAGE = 20
+MIN_SAMPLES = 5  # below this a recorded distribution falls back to the defaults
+
+# Used where run-metrics.jsonl has nothing to fit: (median, spread) of a lognormal
+DEFAULT_FETCH_SECONDS = {"search": (4.0, 0.5), "product": (6.0, 0.5)}
+DEFAULT_FETCH_BYTES = {"search": 1_500_000, "product": 900_000}
+DEFAULT_DRIVER_START = (2.5, 0.3)
+DEFAULT_REJECT_RATE = 0.05
+DEFAULT_ERROR_RATE = 0.02
+DEFAULT_DRIVER_RSS_MB = (350.0, 600.0)  # average, peak
+BASE_PROCESS_MB = 80.0
+
+
+def page_type_of(url):
+    return "search" if "/search" in url else "product"
+
+
+class CrawlModel:
+
+    def __init__(self):
+        self.fetch_seconds = defaultdict(list)  # (page_type, route) -> seconds
+        self.fetch_bytes = defaultdict(list)  # page_type -> bytes
+        self.driver_start = []
+        self.fetches = Counter()  # (page_type, route)
+        self.rejections = Counter()  # (page_type, route)
+        self.errors = Counter()  # page_type
+        self.cards_per_page = []
+        self.page_counts = []
+        self.driver_rss_mb = []
+        self.driver_peak_mb = []
+
+    @classmethod
+    def from_metrics(cls, filename):
+        model = cls()
+        try:
+            metrics_file = open(filename, encoding="utf-8")
+        except OSError as e:
+            logger.warning(f"No recorded metrics ({e}), using defaults")
+            return model
+        with metrics_file:
+            for line in metrics_file:
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    continue
+                name = event.get("event")
+                if name == "page_fetch":
+                    key = (event["page_type"], event.get("route", "default"))
+                    model.fetches[key] += 1
+                    model.fetch_seconds[key].append(event["seconds"])
+                    if event.get("bytes"):
+                        model.fetch_bytes[event["page_type"]].append(event["bytes"])
+                elif name == "page_rejected":
+                    model.rejections[(page_type_of(event["url"]), event.get("route", "default"))] += 1
+                elif name == "page_error":
+                    model.errors[event["page_type"]] += 1
+                elif name == "driver_start":
+                    model.driver_start.append(event["seconds"])
+                elif name == "search_page":
+                    model.cards_per_page.append(event["cards"])
+                    if event.get("page_count"):
+                        model.page_counts.append(event["page_count"])
+                elif name == "worker_memory":
+                    model.driver_rss_mb.append(event["avg_rss_mb"])
+                    model.driver_peak_mb.append(event["peak_rss_mb"])
+        return model
+
+    def sample_fetch(self, page_type, route, rng):
+        # Bootstrap from what was recorded, per route where there is enough of it
+        for key in ((page_type, route), (page_type, "default")):
+            if len(self.fetch_seconds[key]) >= MIN_SAMPLES:
+                return rng.choice(self.fetch_seconds[key])
+        median, spread = DEFAULT_FETCH_SECONDS[page_type]
+        return rng.lognormvariate(math.log(median), spread)
+
+    def sample_bytes(self, page_type, rng):
+        if len(self.fetch_bytes[page_type]) >= MIN_SAMPLES:
+            return rng.choice(self.fetch_bytes[page_type])
+        return DEFAULT_FETCH_BYTES[page_type]
+
+    def sample_driver_start(self, rng):
+        if len(self.driver_start) >= MIN_SAMPLES:
+            return rng.choice(self.driver_start)
+        median, spread = DEFAULT_DRIVER_START
+        return rng.lognormvariate(math.log(median), spread)
+
+    def sample_cards(self, rng):
+        if len(self.cards_per_page) >= MIN_SAMPLES:
+            return rng.choice(self.cards_per_page)
+        return RESULTS_PER_PAGE
+
+    def sample_page_count(self, max_pages, rng):
+        if len(self.page_counts) >= MIN_SAMPLES:
+            return min(rng.choice(self.page_counts), max_pages)
+        return max_pages
+
+    def reject_rate(self, page_type, route):
+        fetches = self.fetches[(page_type, route)]
+        if fetches >= MIN_SAMPLES:
+            return self.rejections[(page_type, route)] / fetches
+        return DEFAULT_REJECT_RATE
+
+    def error_rate(self, page_type):
+        fetches = sum(count for (fetched_type, _), count in self.fetches.items() if fetched_type == page_type)
+        if fetches >= MIN_SAMPLES:
+            return self.errors[page_type] / fetches
+        return DEFAULT_ERROR_RATE
+
+    def driver_memory(self):
+        if self.driver_rss_mb:
+            return sum(self.driver_rss_mb) / len(self.driver_rss_mb), max(self.driver_peak_mb)
+        return DEFAULT_DRIVER_RSS_MB
+
+    def describe(self):
+        for page_type in ("search", "product"):
+            for route in ROUTES:
+                samples = self.fetch_seconds[(page_type, route)]
+                fitted = f"{len(samples)} samples, mean {sum(samples) / len(samples):.2f}s" if samples else "default"
+                logger.info(
+                    f"{page_type}/{route}: fetch {fitted}, "
+                    f"rejected {self.reject_rate(page_type, route):.1%}"
+                )
+            logger.info(f"{page_type}: error rate {self.error_rate(page_type):.1%}")
+        average, peak = self.driver_memory()
+        logger.info(
+            f"driver start: {len(self.driver_start)} samples, "
+            f"cards/page: {len(self.cards_per_page)} samples, page counts: {len(self.page_counts)} samples, "
+            f"driver RSS avg {average:.0f} MB peak {peak:.0f} MB"
+        )
+
+
+class Simulation:
+
+    def __init__(self, model, threads, retries, max_pages, requests_per_second=0, driver_max_pages=DRIVER_MAX_PAGES, seed=0):
+        self.model = model
+        self.threads = threads
+        self.retries = retries
+        self.max_pages = max_pages
+        self.request_interval = 1 / requests_per_second if requests_per_second else 0
+        self.driver_max_pages = driver_max_pages
+        self.rng = random.Random(seed)
+        self.next_request = 0.0
+        # Pages served by each worker's current driver, None when it has to start one
+        self.drivers = [None] * threads
+        self.stats = Counter()
+
+    def fetch(self, worker, page_type, route, now):
+        if self.drivers[worker] is None:
+            now += self.model.sample_driver_start(self.rng)
+            self.drivers[worker] = 0
+            self.stats["driver_starts"] += 1
+        # A proxy rate limit spaces out request starts across all workers
+        if self.request_interval:
+            now = max(now, self.next_request)
+            self.next_request = now + self.request_interval
+        now += self.model.sample_fetch(page_type, route, self.rng)
+        self.stats["page_fetches"] += 1
+        self.stats["credits"] += ROUTE_CREDITS[route]
+        self.stats["bytes"] += self.model.sample_bytes(page_type, self.rng)
+        return now
+
+    def run_job(self, worker, page_type, now):
+        # Mirrors the retry loops in scrape_search_results/process_business
+        for tries in range(self.retries + 1):
+            route = ROUTES[tries % len(ROUTES)]
+            now = self.fetch(worker, page_type, route, now)
+            if self.rng.random() < self.model.reject_rate(page_type, route):
+                self.stats["rejections"] += 1
+                continue
+            if self.rng.random() < self.model.error_rate(page_type):
+                # Failed drivers are retired by the pool
+                self.stats["errors"] += 1
+                self.drivers[worker] = None
+                continue
+            self.drivers[worker] += 1
+            if self.drivers[worker] >= self.driver_max_pages:
+                self.drivers[worker] = None
+            return now, True
+        return now, False
+
+    def run_pool(self, jobs, now, spawn=False):
+        # jobs are (page_type, keyword, page_number); workers pick them up in order as they free up
+        queue = deque(jobs)
+        idle = list(range(self.threads))
+        running = []
+        while queue or running:
+            while queue and idle:
+                worker = idle.pop()
+                job = queue.popleft()
+                finished, ok = self.run_job(worker, job[0], now)
+                heapq.heappush(running, (finished, worker, job, ok))
+            now, worker, job, ok = heapq.heappop(running)
+            idle.append(worker)
+            if not ok:
+                self.stats[f"{job[0]}_failed"] += 1
+                continue
+            self.stats[f"{job[0]}_done"] += 1
+            if spawn:
+                queue.extend(self.children(job))
+        return now
+
+    def children(self, job):
+        page_type, keyword, page_number = job
+        if page_type != "search":
+            return []
+        products = [("product", keyword, None)] * self.model.sample_cards(self.rng)
+        if page_number == 0:
+            pages = self.model.sample_page_count(self.max_pages, self.rng)
+            return [("search", keyword, number) for number in range(1, pages)] + products
+        return products
+
+    def run_local(self, keywords):
+        # Same shape as local mode: each keyword's search, page 1 first, then every keyword's products
+        now = 0.0
+        products = {}
+        for keyword in keywords:
+            done = self.stats["search_done"]
+            now = self.run_pool([("search", keyword, 0)], now)
+            pages = self.model.sample_page_count(self.max_pages, self.rng) if self.stats["search_done"] > done else 1
+            now = self.run_pool([("search", keyword, number) for number in range(1, pages)], now)
+            products[keyword] = sum(self.model.sample_cards(self.rng) for _ in range(self.stats["search_done"] - done))
+        for keyword in keywords:
+            now = self.run_pool([("product", keyword, None)] * products[keyword], now)
+        return now
+
+    def run_stream(self, keywords):
+        # Same shape as --stream: one shared pool, products queued as soon as their search page lands
+        return self.run_pool([("search", keyword, 0) for keyword in keywords], 0.0, spawn=True)
+
+    def result(self, wall_seconds):
+        average_mb, peak_mb = self.model.driver_memory()
+        return {
+            "wall_seconds": wall_seconds,
+            "page_fetches": self.stats["page_fetches"],
+            "credits": self.stats["credits"],
+            "gigabytes": self.stats["bytes"] / 1e9,
+            "driver_starts": self.stats["driver_starts"],
+            "products": self.stats["product_done"],
+            "failed_jobs": self.stats["search_failed"] + self.stats["product_failed"],
+            "memory_mb": BASE_PROCESS_MB + self.threads * average_mb,
+            "peak_memory_mb": BASE_PROCESS_MB + self.threads * peak_mb
+        }
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def simulate(model, keywords, threads, retries, max_pages, mode="local", runs=20, requests_per_second=0):
+    results = []
+    for seed in range(runs):
+        simulation = Simulation(model, threads, retries, max_pages, requests_per_second=requests_per_second, seed=seed)
+        wall_seconds = simulation.run_stream(keywords) if mode == "stream" else simulation.run_local(keywords)
+        results.append(simulation.result(wall_seconds))
+    summary = {name: sum(result[name] for result in results) / runs for name in results[0]}
+    summary["wall_seconds_p90"] = percentile([result["wall_seconds"] for result in results], 0.9)
+    return summary
+
+
+def plan_report(model, keywords, thread_options, retry_options, max_pages, mode, runs, requests_per_second):
+    logger.info(f"Planning {len(keywords)} keywords, up to {max_pages} pages each, {mode} mode, {runs} runs per setting")
+    rows = []
+    for threads in thread_options:
+        for retries in retry_options:
+            summary = simulate(model, keywords, threads, retries, max_pages, mode, runs, requests_per_second)
+            rows.append((threads, retries, summary))
+            logger.info(
+                f"threads={threads:<3} retries={retries}: "
+                f"wall {summary['wall_seconds'] / 60:.1f} min (p90 {summary['wall_seconds_p90'] / 60:.1f}), "
+                f"{summary['page_fetches']:.0f} fetches, {summary['credits']:.0f} credits, "
+                f"{summary['gigabytes']:.2f} GB, {summary['driver_starts']:.0f} driver starts, "
+                f"{summary['products']:.0f} products, {summary['failed_jobs']:.1f} failed jobs, "
+                f"memory {summary['memory_mb']:.0f} MB (peak {summary['peak_memory_mb']:.0f} MB)"
+            )
+    return rows
+
+
+if __name__ == "__main__":
+
+    METRICS_FILE = "run-metrics.jsonl"
+    PAGES = 50
+    RUNS = 20
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--metrics", default=METRICS_FILE)
+    parser.add_argument("--keywords", nargs="+", default=["online bank"])
+    parser.add_argument("--pages", type=int, default=PAGES)
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 5, 10, 20])
+    parser.add_argument("--retries", type=int, nargs="+", default=[3])
+    parser.add_argument("--mode", choices=["local", "stream"], default="local")
+    parser.add_argument("--runs", type=int, default=RUNS)
+    parser.add_argument("--requests-per-second", type=float, default=0, help="proxy rate limit, 0 for none")
+    args = parser.parse_args()
+
+    model = CrawlModel.from_metrics(args.metrics)
+    model.describe()
+    plan_report(model, args.keywords, args.threads, args.retries, args.pages, args.mode, args.runs, args.requests_per_second)
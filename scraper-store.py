@@ -0,0 +1,359 @@
+import json
+import time
+import sqlite3
+import logging
+import argparse
+import threading
+from types import SimpleNamespace
+from collections import Counter, defaultdict
+from urllib.parse import urlsplit, urlunsplit
+
+
+## Logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def normalize_product_url(g2_url):
+    parts = urlsplit(g2_url.strip())
+    path = parts.path.rstrip("/")
+    # /products/<slug>/reviews and /products/<slug> are the same product
+    if path.endswith("/reviews"):
+        path = path[:-len("/reviews")]
+    return urlunsplit(("https", parts.netloc.lower(), path.lower(), "", ""))
+
+
+## Review store
+REVIEW_DB = "reviews.db"
+
+
+class ReviewSummary:
+
+    def __init__(self, count=0, rating_total=0.0, histogram=None, validated=0, incentivized=0, sources=None):
+        # Plain counts only, so two summaries merge by adding and never need the reviews again
+        self.count = count
+        self.rating_total = rating_total
+        self.histogram = Counter(histogram or {})
+        self.validated = validated
+        self.incentivized = incentivized
+        self.sources = Counter(sources or {})
+
+    def add(self, review):
+        self.count += 1
+        self.rating_total += float(review.rating)
+        # Half-star buckets, G2 ratings come in 0.5 steps
+        self.histogram[str(round(float(review.rating) * 2) / 2)] += 1
+        self.validated += bool(review.validated)
+        self.incentivized += bool(review.incentivized)
+        self.sources[review.review_source or "unknown"] += 1
+
+    def merge(self, other):
+        self.count += other.count
+        self.rating_total += other.rating_total
+        self.histogram.update(other.histogram)
+        self.validated += other.validated
+        self.incentivized += other.incentivized
+        self.sources.update(other.sources)
+        return self
+
+    def to_json(self):
+        return json.dumps({
+            "count": self.count,
+            "rating_total": self.rating_total,
+            "histogram": self.histogram,
+            "validated": self.validated,
+            "incentivized": self.incentivized,
+            "sources": self.sources
+        })
+
+    @classmethod
+    def from_json(cls, text):
+        return cls(**json.loads(text)) if text else cls()
+
+    def report(self):
+        share = lambda value: round(value / self.count, 4) if self.count else 0.0
+        return {
+            "reviews": self.count,
+            "average_rating": round(self.rating_total / self.count, 3) if self.count else None,
+            "histogram": dict(sorted(self.histogram.items(), key=lambda item: float(item[0]))),
+            "validated_share": share(self.validated),
+            "incentivized_share": share(self.incentivized),
+            "sources": dict(self.sources.most_common())
+        }
+
+
+class ReviewStore:
+
+    def __init__(self, db_filename=REVIEW_DB):
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(db_filename, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.create_tables()
+
+    def create_tables(self):
+        with self.lock, self.connection:
+            self.connection.executescript("""
+                CREATE TABLE IF NOT EXISTS products (
+                    g2_url TEXT PRIMARY KEY,
+                    name TEXT,
+                    stars TEXT,
+                    description TEXT
+                );
+                CREATE TABLE IF NOT EXISTS product_keywords (
+                    g2_url TEXT,
+                    keyword TEXT,
+                    PRIMARY KEY (keyword, g2_url)
+                );
+                CREATE TABLE IF NOT EXISTS reviews (
+                    id INTEGER PRIMARY KEY,
+                    g2_url TEXT,
+                    product TEXT,
+                    name TEXT,
+                    date TEXT,
+                    job_title TEXT,
+                    rating REAL,
+                    full_review TEXT,
+                    review_source TEXT,
+                    validated INTEGER,
+                    incentivized INTEGER,
+                    content_hash TEXT,
+                    near_duplicate INTEGER,
+                    UNIQUE (g2_url, content_hash)
+                );
+                CREATE INDEX IF NOT EXISTS reviews_by_product_date ON reviews (g2_url, date);
+                CREATE INDEX IF NOT EXISTS reviews_by_product_rating ON reviews (g2_url, rating);
+                CREATE INDEX IF NOT EXISTS product_keywords_by_product ON product_keywords (g2_url);
+                CREATE VIRTUAL TABLE IF NOT EXISTS reviews_fts USING fts5(
+                    full_review, product, job_title, content='reviews', content_rowid='id'
+                );
+                CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5(
+                    name, description, content='products', content_rowid='rowid'
+                );
+                CREATE TABLE IF NOT EXISTS product_fingerprints (
+                    g2_url TEXT PRIMARY KEY,
+                    stars TEXT,
+                    review_count TEXT,
+                    newest_date TEXT,
+                    page_hash TEXT,
+                    checked REAL
+                );
+                CREATE TABLE IF NOT EXISTS review_summaries (
+                    scope TEXT,
+                    key TEXT,
+                    summary TEXT,
+                    PRIMARY KEY (scope, key)
+                );
+            """)
+            # Databases from before summaries existed get backfilled once
+            has_reviews = self.connection.execute("SELECT 1 FROM reviews LIMIT 1").fetchone()
+            has_summaries = self.connection.execute("SELECT 1 FROM review_summaries LIMIT 1").fetchone()
+            if has_reviews and not has_summaries:
+                self.rebuild_summaries()
+
+    def load_summary(self, scope, key):
+        row = self.connection.execute(
+            "SELECT summary FROM review_summaries WHERE scope = ? AND key = ?", (scope, key)
+        ).fetchone()
+        return ReviewSummary.from_json(row[0] if row else None)
+
+    def merge_summary(self, scope, key, delta):
+        summary = self.load_summary(scope, key).merge(delta)
+        self.connection.execute(
+            "INSERT OR REPLACE INTO review_summaries (scope, key, summary) VALUES (?, ?, ?)",
+            (scope, key, summary.to_json())
+        )
+
+    def rebuild_summaries(self):
+        self.connection.execute("DELETE FROM review_summaries")
+        products = defaultdict(ReviewSummary)
+        for review in self.connection.execute(
+            "SELECT g2_url, rating, validated, incentivized, review_source FROM reviews"
+        ):
+            products[review[0]].add(SimpleNamespace(
+                rating=review[1] or 0, validated=review[2], incentivized=review[3], review_source=review[4] or ""
+            ))
+        keywords = defaultdict(ReviewSummary)
+        for product_id, keyword in self.connection.execute("SELECT g2_url, keyword FROM product_keywords"):
+            if product_id in products:
+                keywords[keyword].merge(products[product_id])
+        for scope, summaries in (("product", products), ("keyword", keywords)):
+            for key, summary in summaries.items():
+                self.merge_summary(scope, key, summary)
+
+    def add_products(self, keyword, items):
+        with self.lock, self.connection:
+            for item in items:
+                product_id = normalize_product_url(item.g2_url)
+                existing = self.connection.execute(
+                    "SELECT rowid FROM products WHERE g2_url = ?", (product_id,)
+                ).fetchone()
+                if existing is None:
+                    cursor = self.connection.execute(
+                        "INSERT INTO products (g2_url, name, stars, description) VALUES (?, ?, ?, ?)",
+                        (product_id, item.name, str(item.stars), item.description)
+                    )
+                    self.connection.execute(
+                        "INSERT INTO products_fts (rowid, name, description) VALUES (?, ?, ?)",
+                        (cursor.lastrowid, item.name, item.description)
+                    )
+                cursor = self.connection.execute(
+                    "INSERT OR IGNORE INTO product_keywords (g2_url, keyword) VALUES (?, ?)",
+                    (product_id, keyword)
+                )
+                # A newly linked product brings the reviews it already has into the keyword's totals
+                if cursor.rowcount:
+                    self.merge_summary("keyword", keyword, self.load_summary("product", product_id))
+
+    def add_reviews(self, row, reviews):
+        product_id = normalize_product_url(row["g2_url"])
+        added = 0
+        delta = ReviewSummary()
+        with self.lock, self.connection:
+            for review in reviews:
+                cursor = self.connection.execute(
+                    "INSERT OR IGNORE INTO reviews (g2_url, product, name, date, job_title, rating, full_review,"
+                    " review_source, validated, incentivized, content_hash, near_duplicate)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        product_id, row["name"], review.name, review.date, review.job_title,
+                        review.rating, review.full_review, review.review_source,
+                        review.validated, review.incentivized, review.identity_hash(), review.near_duplicate
+                    )
+                )
+                # Already indexed by an earlier run
+                if cursor.rowcount == 0:
+                    continue
+                self.connection.execute(
+                    "INSERT INTO reviews_fts (rowid, full_review, product, job_title) VALUES (?, ?, ?, ?)",
+                    (cursor.lastrowid, review.full_review, row["name"], review.job_title)
+                )
+                delta.add(review)
+                added += 1
+            # Only reviews that were actually inserted count, so reruns don't inflate the totals
+            if added:
+                self.merge_summary("product", product_id, delta)
+                for (keyword,) in self.connection.execute(
+                    "SELECT keyword FROM product_keywords WHERE g2_url = ?", (product_id,)
+                ).fetchall():
+                    self.merge_summary("keyword", keyword, delta)
+        return added
+
+    def fingerprint(self, product_id):
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT stars, review_count, newest_date, page_hash, checked FROM product_fingerprints WHERE g2_url = ?",
+                (product_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return dict(zip(("stars", "review_count", "newest_date", "page_hash", "checked"), row))
+
+    def save_fingerprint(self, product_id, fingerprint):
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO product_fingerprints (g2_url, stars, review_count, newest_date, page_hash, checked)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    product_id, fingerprint["stars"], fingerprint["review_count"],
+                    fingerprint["newest_date"], fingerprint["page_hash"], fingerprint["checked"]
+                )
+            )
+
+    def summary(self, scope, key):
+        with self.lock:
+            return self.load_summary(scope, key).report()
+
+    def search_reviews(self, query, limit=20):
+        with self.lock:
+            return self.connection.execute("""
+                SELECT r.product, r.rating, r.date, r.name,
+                       snippet(reviews_fts, 0, '[', ']', '...', 12) AS snippet,
+                       bm25(reviews_fts) AS score
+                FROM reviews_fts
+                JOIN reviews r ON r.id = reviews_fts.rowid
+                WHERE reviews_fts MATCH ?
+                ORDER BY score
+                LIMIT ?
+            """, (query, limit)).fetchall()
+
+    def search_products(self, query, limit=20):
+        with self.lock:
+            return self.connection.execute("""
+                SELECT p.name, p.stars, p.g2_url, bm25(products_fts) AS score
+                FROM products_fts
+                JOIN products p ON p.rowid = products_fts.rowid
+                WHERE products_fts MATCH ?
+                ORDER BY score
+                LIMIT ?
+            """, (query, limit)).fetchall()
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+
+review_store = None
+review_store_lock = threading.Lock()
+
+
+def get_review_store():
+    global review_store
+    with review_store_lock:
+        if review_store is None:
+            review_store = ReviewStore()
+        return review_store
+
+
+def product_indexer(keyword):
+    return lambda items: get_review_store().add_products(keyword, items)
+
+
+def review_indexer(row):
+    return lambda reviews: get_review_store().add_reviews(row, reviews)
+
+
+def search_index(store, query, limit=20):
+    started = time.perf_counter()
+    review_hits = store.search_reviews(query, limit=limit)
+    product_hits = store.search_products(query, limit=limit)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+
+    for name, stars, g2_url, score in product_hits:
+        print(f"[product] {name} ({stars} stars) {g2_url}")
+    for product, rating, date, reviewer, snippet, score in review_hits:
+        print(f"[review] {product} | {rating} stars | {date} | {reviewer}: {snippet}")
+    logger.info(f"{len(review_hits)} reviews and {len(product_hits)} products matched in {elapsed_ms:.1f} ms")
+
+
+def log_keyword_summaries(keywords):
+    store = get_review_store()
+    for keyword in keywords:
+        summary = store.summary("keyword", keyword)
+        logger.info(
+            f"{keyword}: {summary['reviews']} reviews, average {summary['average_rating']}, "
+            f"{summary['validated_share']:.0%} validated, {summary['incentivized_share']:.0%} incentivized, "
+            f"ratings {summary['histogram']}, sources {summary['sources']}"
+        )
+
+
+if __name__ == "__main__":
+
+    RESULTS = 20
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--db", default=REVIEW_DB)
+    parser.add_argument("--query", required=True, help="full-text query, FTS5 syntax")
+    parser.add_argument("--limit", type=int, default=RESULTS)
+    args = parser.parse_args()
+
+    store = ReviewStore(args.db)
+    try:
+        search_index(store, args.query, limit=args.limit)
+    except sqlite3.OperationalError as e:
+        # FTS5 rejects malformed queries (e.g. c++) at MATCH time, anything else is a real storage error
+        if "fts5" not in str(e):
+            raise
+        parser.error(f"invalid --query {args.query!r} ({e}), quote terms with symbols, e.g. '\"c++\"'")
+    finally:
+        store.close()